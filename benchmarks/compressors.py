@@ -0,0 +1,155 @@
+"""
+Compare compressors by compression ratio and time per image.
+
+Usage:
+    python benchmarks/compressors.py [image paths] [--repeat 3]
+
+Without paths generated sample images are used. Compressors of local
+commands (pngquant, cjpeg, oxipng) are benchmarked, if they're installed,
+TinyPNG - if TINYPNG_API_KEY environment variable is set.
+"""
+import argparse
+import io
+import os
+import shutil
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import django  # noqa: E402
+from django.conf import settings  # noqa: E402
+
+if not settings.configured:
+    settings.configure(TINYPNG_API_KEY=os.environ.get('TINYPNG_API_KEY'))
+    django.setup()
+
+from django.core.files import File  # noqa: E402
+from PIL import Image  # noqa: E402
+
+from ok_images.compressors import (  # noqa: E402
+    CommandCompressor,
+    PillowCompressor,
+    PillowQuantizeCompressor,
+    TinyPNGCompressor
+)
+from ok_images.utils import get_file_extension  # noqa: E402
+
+
+def get_sample_images():
+    """Return (name, bytes) of generated photo-like and flat images."""
+    photo = Image.merge('RGB', [
+        Image.effect_mandelbrot((1200, 900), (-2, -1.2, 1, 1.2), 60),
+        Image.radial_gradient('L').resize((1200, 900)),
+        Image.effect_noise((1200, 900), 30),
+    ])
+    flat = Image.new('RGB', (800, 600), '#ffffff')
+    flat.paste(Image.new('RGB', (400, 300), '#2a7ae2'), (100, 100))
+    logo = Image.new('RGBA', (512, 512), (0, 0, 0, 0))
+    logo.paste(photo.resize((256, 256)).convert('RGBA'), (128, 128))
+
+    samples = []
+
+    for name, image, format in (
+            ('photo.jpg', photo, 'JPEG'),
+            ('photo.png', photo, 'PNG'),
+            ('flat.png', flat, 'PNG'),
+            ('logo.png', logo, 'PNG'),
+            ('photo.webp', photo, 'WEBP'),
+    ):
+        buffer = io.BytesIO()
+        image.save(buffer, format, quality=100)
+        samples.append((name, buffer.getvalue()))
+
+    return samples
+
+
+def get_compressors():
+    compressors = {
+        'pillow': PillowCompressor(),
+        'pillow-lossy-webp': PillowCompressor(lossless=False, method=6),
+        'pillow-quantize': PillowQuantizeCompressor(),
+    }
+    commands = {
+        'pngquant': (['pngquant', '--quality=65-80', '-'], ['PNG']),
+        'cjpeg': (['cjpeg', '-quality', '80'], ['JPEG']),
+        'oxipng': (['oxipng', '-o', '4', '--stdout', '-'], ['PNG']),
+    }
+
+    for name, (command, formats) in commands.items():
+        if shutil.which(command[0]):
+            compressors[name] = CommandCompressor(command, formats=formats)
+
+    if settings.TINYPNG_API_KEY:
+        compressors['tinypng'] = TinyPNGCompressor()
+
+    return compressors
+
+
+def get_size(content):
+    if isinstance(content, bytes):
+        return len(content)
+
+    content.seek(0, os.SEEK_END)
+    size = content.tell()
+    content.close()
+    return size
+
+
+def benchmark(compressor, name, data, repeat):
+    """Return compressed size and the best time in seconds or `None`."""
+    extension = get_file_extension(name)
+    times = []
+    size = None
+
+    for _ in range(repeat):
+        file = File(io.BytesIO(data), name=name)
+        file.size = len(data)
+        started_at = time.perf_counter()
+        content = compressor.compress(file, extension)
+        times.append(time.perf_counter() - started_at)
+
+        if content is None:
+            return None
+
+        size = get_size(content)
+
+    return size, min(times)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('paths', nargs='*')
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    if args.paths:
+        images = []
+
+        for path in args.paths:
+            with open(path, 'rb') as f:
+                images.append((os.path.basename(path), f.read()))
+    else:
+        images = get_sample_images()
+
+    print(
+        f"{'image':<16}{'compressor':<20}{'bytes':>10}"
+        f"{'compressed':>12}{'ratio':>8}{'ms':>9}"
+    )
+
+    for name, data in images:
+        for compressor_name, compressor in get_compressors().items():
+            result = benchmark(compressor, name, data, args.repeat)
+
+            if result is None:
+                continue
+
+            size, seconds = result
+            print(
+                f'{name:<16}{compressor_name:<20}{len(data):>10}'
+                f'{size:>12}{size / len(data):>8.2f}{seconds * 1000:>9.1f}'
+            )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,124 @@
+"""
+Compare the cost of building storage paths and urls of renditions
+with and without the rendition path cache.
+
+Usage:
+    python benchmarks/rendition_paths.py [--images 1000] [--repeat 5]
+
+Each sizer and `to_webp` filter builds a path and an url of a rendition
+of each image without touching storage or creating images. "uncached"
+is the cost without the cache, "miss" - of a first access with it,
+"hit" - of a next access.
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import django  # noqa: E402
+from django.conf import settings  # noqa: E402
+
+if not settings.configured:
+    settings.configure(
+        INSTALLED_APPS=['versatileimagefield', 'ok_images'],
+        MEDIA_ROOT=tempfile.mkdtemp(),
+        MEDIA_URL='/media/',
+        CACHES={
+            'default': {
+                'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'
+            }
+        },
+    )
+    django.setup()
+
+from django.core.files.storage import FileSystemStorage  # noqa: E402
+
+from ok_images.contrib.versatileimagefield.utils import (  # noqa: E402
+    rendition_paths
+)
+from ok_images.contrib.versatileimagefield import (  # noqa: E402
+    versatileimagefield as sizers
+)
+
+SIZE = '460x430'
+
+
+def get_renditions(storage, names):
+    """Return callables, which build a rendition of each image."""
+    sized_images = (
+        ('crop', sizers.CroppedImage),
+        ('thumbnail', sizers.ThumbnailImage),
+        ('crop_webp', sizers.WebPCroppedImage),
+        ('thumbnail_webp', sizers.WebPThumbnailImage),
+    )
+    renditions = {
+        key: [
+            sizer(name, storage, False, ppoi=(0.5, 0.5)).__getitem__
+            for name in names
+        ]
+        for key, sizer in sized_images
+    }
+    renditions['to_webp'] = [
+        lambda name=name: sizers.ToWebPImage(
+            name, storage, False, 'to_webp'
+        )
+        for name in names
+    ]
+    return renditions
+
+
+def run(renditions, key):
+    started_at = time.perf_counter()
+
+    for rendition in renditions:
+        if key is None:
+            rendition()
+        else:
+            rendition(key)
+
+    return (time.perf_counter() - started_at) / len(renditions)
+
+
+def benchmark(renditions, key, repeat, maxsize):
+    """Return the best time per call of a miss and of a hit in seconds."""
+    rendition_paths.maxsize = maxsize
+    misses, hits = [], []
+
+    for _ in range(repeat):
+        rendition_paths.clear()
+        misses.append(run(renditions, key))
+        hits.append(run(renditions, key))
+
+    return min(misses), min(hits)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--images', type=int, default=1000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    storage = FileSystemStorage()
+    names = [
+        f'store/product/2021/04/01/photo-{i}.jpg'
+        for i in range(args.images)
+    ]
+    maxsize = max(rendition_paths.maxsize, args.images)
+
+    print(f"{'rendition':<16}{'uncached us':>12}{'miss us':>10}{'hit us':>10}")
+
+    for name, renditions in get_renditions(storage, names).items():
+        key = None if name == 'to_webp' else SIZE
+        uncached = min(benchmark(renditions, key, args.repeat, 0))
+        miss, hit = benchmark(renditions, key, args.repeat, maxsize)
+        print(
+            f'{name:<16}{uncached * 1e6:>12.2f}'
+            f'{miss * 1e6:>10.2f}{hit * 1e6:>10.2f}'
+        )
+
+
+if __name__ == '__main__':
+    main()
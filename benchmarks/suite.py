@@ -0,0 +1,375 @@
+"""
+Benchmark upload, rendition and serialization hot paths.
+
+Usage:
+    python benchmarks/suite.py [--output results.json]
+    python benchmarks/suite.py --compare baseline.json [--threshold 0.1]
+
+Images are stored with a local `FileSystemStorage` in a temporary folder,
+cache is `LocMemCache` and a database is in-memory SQLite, so results
+don't depend on network. TinyPNG is used, only if TINYPNG_API_KEY
+environment variable is set.
+
+Results are printed (or saved with `--output`) as JSON. With `--compare`
+medians are compared with a saved baseline, and the script exits with
+status 1, if any benchmark is slower by more than `--threshold`.
+"""
+import argparse
+import io
+import json
+import os
+import platform
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import django  # noqa: E402
+from django.conf import settings  # noqa: E402
+
+MEDIA_ROOT = tempfile.mkdtemp()
+
+if not settings.configured:
+    settings.configure(
+        INSTALLED_APPS=['versatileimagefield', 'ok_images'],
+        DATABASES={
+            'default': {
+                'ENGINE': 'django.db.backends.sqlite3',
+                'NAME': ':memory:'
+            }
+        },
+        CACHES={
+            'default': {
+                'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'
+            }
+        },
+        MEDIA_ROOT=MEDIA_ROOT,
+        MEDIA_URL='/media/',
+        USE_TZ=True,
+        TINYPNG_API_KEY=os.environ.get('TINYPNG_API_KEY'),
+        VERSATILEIMAGEFIELD_RENDITION_KEY_SETS={
+            'benchmark': [
+                ('full_size', 'url'),
+                ('desktop', 'crop__460x430'),
+                ('catalog_preview', 'thumbnail__180x180'),
+                ('desktop_webp', 'crop_webp__460x430'),
+                ('catalog_preview_webp', 'thumbnail_webp__180x180'),
+                ('webp', 'filters__to_webp__url'),
+            ]
+        },
+    )
+    django.setup()
+
+import PIL  # noqa: E402
+from PIL import Image  # noqa: E402
+
+from django.core.files.base import ContentFile  # noqa: E402
+from django.core.files.storage import default_storage  # noqa: E402
+from django.core.files.uploadedfile import SimpleUploadedFile  # noqa: E402
+from django.db import connection, models  # noqa: E402
+from versatileimagefield.fields import PPOIField  # noqa: E402
+from versatileimagefield.registry import (  # noqa: E402
+    versatileimagefield_registry
+)
+from versatileimagefield.settings import cache  # noqa: E402
+
+# registers webp sizers and filter
+from ok_images.contrib.versatileimagefield import (  # noqa: E402,F401
+    versatileimagefield
+)
+from ok_images.contrib.rest_framework.fields import (  # noqa: E402
+    WebPVersatileImageFieldSerializer
+)
+from ok_images.contrib.versatileimagefield.utils import (  # noqa: E402
+    rendition_paths
+)
+from ok_images.fields import OptimizedImageField  # noqa: E402
+from ok_images.utils import (  # noqa: E402
+    delete_all_created_images,
+    image_optimizer
+)
+
+FORMATS = {
+    'JPEG': 'jpg',
+    'PNG': 'png',
+    'WEBP': 'webp',
+}
+SIZERS = ('crop', 'thumbnail', 'crop_webp', 'thumbnail_webp')
+FILTERS = ('to_webp',)
+RENDITION_SIZE = (460, 430)
+
+
+class BenchmarkImage(models.Model):
+    image_sizes = 'benchmark'
+    image = OptimizedImageField(
+        ppoi_field='ppoi',
+        image_sizes_serializer=WebPVersatileImageFieldSerializer,
+        create_on_demand=True
+    )
+    ppoi = PPOIField()
+
+    class Meta:
+        app_label = 'ok_images'
+
+
+def make_image(width, height):
+    """Return a photo-like image."""
+    return Image.merge('RGB', [
+        Image.effect_mandelbrot(
+            (width, height), (-2, -1.2, 1, 1.2), 60
+        ),
+        Image.radial_gradient('L').resize((width, height)),
+        Image.effect_noise((width, height), 30),
+    ])
+
+
+def encode(image, format):
+    buffer = io.BytesIO()
+    image.save(buffer, format, quality=95)
+    return buffer.getvalue()
+
+
+def measure(func, repeat, setup=None, calls=1):
+    """
+    Run `func` `repeat` times (after `setup`, which isn't measured)
+    and return stats of seconds per call.
+    """
+    times = []
+
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+
+        started_at = time.perf_counter()
+        func()
+        times.append((time.perf_counter() - started_at) / calls)
+
+    return {
+        'min': min(times),
+        'median': statistics.median(times),
+        'mean': statistics.mean(times),
+        'repeat': repeat,
+        'calls': calls,
+    }
+
+
+def benchmark_optimizer(sizes, repeat):
+    results = {}
+
+    for width, height in sizes:
+        image = make_image(width, height)
+
+        for format, ext in FORMATS.items():
+            data = encode(image, format)
+            uploads = []
+
+            def setup():
+                uploads[:] = [SimpleUploadedFile(f'image.{ext}', data)]
+
+            results[f'image_optimizer/{format}/{width}x{height}'] = measure(
+                lambda: image_optimizer(uploads[0]), repeat, setup=setup
+            )
+
+    return results
+
+
+def benchmark_sizers(source_name, repeat):
+    results = {}
+    width, height = RENDITION_SIZE
+
+    for key in SIZERS:
+        sizer = versatileimagefield_registry._sizedimage_registry[key](
+            source_name, default_storage, False, ppoi=(0.5, 0.5)
+        )
+        path = sizer[f'{width}x{height}'].name
+        results[f'sizer/{key}/{width}x{height}'] = measure(
+            lambda: sizer.create_resized_image(
+                source_name, path, width, height
+            ),
+            repeat,
+            setup=lambda: default_storage.delete(path)
+        )
+
+    for key in FILTERS:
+        image_filter = versatileimagefield_registry._filter_registry[key](
+            source_name, default_storage, False, key
+        )
+        results[f'filter/{key}'] = measure(
+            lambda: image_filter.create_filtered_image(
+                source_name, image_filter.name
+            ),
+            repeat,
+            setup=lambda: default_storage.delete(image_filter.name)
+        )
+
+    return results
+
+
+def create_instances(source_data, count):
+    with connection.schema_editor() as schema_editor:
+        schema_editor.create_model(BenchmarkImage)
+
+    for i in range(count):
+        name = default_storage.save(
+            f'benchmark/image-{i}.jpg', ContentFile(source_data)
+        )
+        BenchmarkImage.objects.create(image=name)
+
+    return list(BenchmarkImage.objects.all())
+
+
+def warm(instances):
+    """Create renditions of instances."""
+    serializer = WebPVersatileImageFieldSerializer(sizes='benchmark')
+
+    for instance in instances:
+        serializer.to_representation(instance.image)
+
+
+def clear_caches():
+    cache.clear()
+    rendition_paths.clear()
+
+
+def benchmark_instances(instances, repeat):
+    results = {}
+    count = len(instances)
+    field = BenchmarkImage._meta.get_field('image')
+    serializer = WebPVersatileImageFieldSerializer(sizes='benchmark')
+    warm(instances)
+
+    def set_variations():
+        for instance in instances:
+            field.set_variations(instance=instance)
+
+    def to_representation():
+        for instance in instances:
+            serializer.to_representation(instance.image)
+
+    # renditions exist, their urls are cached or not
+    for name, setup in (('warm', None), ('cold', clear_caches)):
+        results[f'set_variations/{name}'] = measure(
+            set_variations, repeat, setup=setup, calls=count
+        )
+        results[f'serializer/to_representation/{name}'] = measure(
+            to_representation, repeat, setup=setup, calls=count
+        )
+
+    results['delete_all_created_images'] = measure(
+        lambda: delete_all_created_images(BenchmarkImage),
+        repeat,
+        setup=lambda: warm(instances),
+        calls=count
+    )
+    return results
+
+
+def get_meta(args):
+    return {
+        'python': platform.python_version(),
+        'django': django.get_version(),
+        'pillow': PIL.__version__,
+        'platform': platform.platform(),
+        'repeat': args.repeat,
+        'instances': args.instances,
+    }
+
+
+def compare(results, baseline, threshold):
+    """Print changes of medians and return names of regressions."""
+    regressions = []
+    print(
+        f"{'benchmark':<44}{'baseline ms':>12}{'current ms':>12}"
+        f"{'change':>9}",
+        file=sys.stderr
+    )
+
+    for name, stats in results.items():
+        base = baseline.get(name)
+
+        if base is None:
+            continue
+
+        change = stats['median'] / base['median'] - 1
+
+        if change > threshold:
+            regressions.append(name)
+
+        print(
+            f"{name:<44}{base['median'] * 1000:>12.3f}"
+            f"{stats['median'] * 1000:>12.3f}{change:>+9.1%}"
+            f"{' !' if name in regressions else ''}",
+            file=sys.stderr
+        )
+
+    return regressions
+
+
+def parse_size(value):
+    width, height = value.split('x')
+    return int(width), int(height)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--instances', type=int, default=50)
+    parser.add_argument(
+        '--sizes',
+        nargs='+',
+        type=parse_size,
+        default=[(640, 480), (1920, 1080)],
+        help='Sizes of images for image_optimizer, e.g. 640x480'
+    )
+    parser.add_argument(
+        '--only',
+        help='Run benchmarks of a group: optimizer, sizers or instances'
+    )
+    parser.add_argument('--output', help='Save results to a JSON file')
+    parser.add_argument('--compare', help='Compare with a baseline JSON file')
+    parser.add_argument('--threshold', type=float, default=0.1)
+    args = parser.parse_args()
+
+    source_data = encode(make_image(1920, 1080), 'JPEG')
+    source_name = default_storage.save(
+        'benchmark/source.jpg', ContentFile(source_data)
+    )
+    groups = {
+        'optimizer': lambda: benchmark_optimizer(args.sizes, args.repeat),
+        'sizers': lambda: benchmark_sizers(source_name, args.repeat),
+        'instances': lambda: benchmark_instances(
+            create_instances(source_data, args.instances), args.repeat
+        ),
+    }
+    results = {}
+
+    try:
+        for group, run in groups.items():
+            if args.only in (None, group):
+                results.update(run())
+    finally:
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+
+    report = json.dumps(
+        {'meta': get_meta(args), 'results': results}, indent=2
+    )
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(report)
+    else:
+        print(report)
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)['results']
+
+        if compare(results, baseline, args.threshold):
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,3 +1,5 @@
 from PIL import ImageFile
 
 ImageFile.LOAD_TRUNCATED_IMAGES = True
+
+default_app_config = 'ok_images.apps.OkImagesConfig'
@@ -0,0 +1,16 @@
+from django.apps import AppConfig
+from django.utils.translation import gettext_lazy as _
+
+__all__ = (
+    'OkImagesConfig',
+)
+
+
+class OkImagesConfig(AppConfig):
+    name = 'ok_images'
+    verbose_name = _('Images')
+
+    def ready(self):
+        from .keysets import compile_key_sets
+
+        compile_key_sets()
@@ -0,0 +1,342 @@
+"""
+Compressors of uploaded and stored images.
+
+Compressors are selected per format with `IMAGE_COMPRESSORS` setting
+and are tried in order until one of them compresses an image.
+"""
+from functools import lru_cache
+import logging
+import os
+import subprocess  # nosec
+import tempfile
+from PIL import Image, features
+from PIL.WebPImagePlugin import WebPImageFile
+
+from django.utils.module_loading import import_string
+
+from .consts import (
+    IMAGE_ALLOWED_EXTENSIONS,
+    IMAGE_COMPRESSORS,
+    IMAGE_DEFAULT_COMPRESSORS,
+    IMAGE_OPTIMIZE_MAX_MEMORY_SIZE,
+    IMAGE_OPTIMIZE_QUALITY,
+    IMAGE_RGBA_CHANGE_BACKGROUND,
+    TINYPNG_ALLOWED_EXTENSIONS
+)
+from .decoding import check_image_pixels
+from .quality import AdaptiveQuality
+from .tinypng import get_tinypng_client
+
+logger = logging.getLogger(__name__)
+
+__all__ = (
+    'BaseCompressor',
+    'TinyPNGCompressor',
+    'PillowCompressor',
+    'PillowQuantizeCompressor',
+    'AdaptiveQualityCompressor',
+    'CommandCompressor',
+    'get_compressors',
+    'remove_alpha',
+)
+
+# formats, which keep transparency
+ALPHA_FORMATS = ('PNG', 'WEBP')
+
+
+def remove_alpha(image, extension=None):
+    """
+    Drop an alpha channel of a fully opaque image. A transparent image
+    is composed on a background only, if `IMAGE_RGBA_CHANGE_BACKGROUND`
+    is set or `extension` format doesn't keep transparency (e.g. JPEG).
+    """
+    if image.mode not in ('RGBA', 'LA'):
+        return image
+
+    alpha = image.getchannel('A')
+
+    # an opaque alpha channel is dropped without composition
+    if alpha.getextrema()[0] == 255:
+        return image.convert(image.mode[:-1])
+
+    if not IMAGE_RGBA_CHANGE_BACKGROUND and extension in ALPHA_FORMATS:
+        return image
+
+    color = (
+        IMAGE_RGBA_CHANGE_BACKGROUND
+        if isinstance(IMAGE_RGBA_CHANGE_BACKGROUND, str)
+        else '#FFFFFF'
+    )
+    background = Image.new(image.mode[:-1], image.size, color)
+    background.paste(image, mask=alpha)
+    return background
+
+
+def is_lossless_webp(data):
+    """Whether a WebP file is encoded losslessly (with a VP8L bitstream)."""
+    data.seek(0)
+    header = data.read(12)
+
+    if header[:4] != b'RIFF' or header[8:12] != b'WEBP':
+        return False
+
+    while True:
+        chunk = data.read(8)
+
+        if len(chunk) < 8:
+            return False
+
+        fourcc, size = chunk[:4], int.from_bytes(chunk[4:], 'little')
+
+        if fourcc == b'VP8L':
+            return True
+
+        if fourcc == b'VP8 ':
+            return False
+
+        # chunks are padded to an even size
+        data.seek(size + size % 2, os.SEEK_CUR)
+
+
+class BaseCompressor:
+    """
+    Compresses an image file `data` of `extension` format
+    (e.g. `JPEG`, `PNG`, `WEBP`).
+
+    Subclasses must implement `compress` method, which returns
+    compressed bytes, a file or `None`, if an image isn't supported.
+    """
+
+    def compress(self, data, extension):
+        raise NotImplementedError(
+            'Subclasses MUST provide a `compress` method.'
+        )
+
+    def open_image(self, data):
+        data.seek(0)
+        image = Image.open(data)
+        check_image_pixels(image)
+        return image
+
+    def get_image(self, data, extension=None):
+        return remove_alpha(self.open_image(data), extension)
+
+    def save_image(self, image, **save_kwargs):
+        """
+        Save an image into a spooled temporary file, which is kept
+        in memory up to `IMAGE_OPTIMIZE_MAX_MEMORY_SIZE` bytes.
+        """
+        optimized_file = tempfile.SpooledTemporaryFile(
+            max_size=IMAGE_OPTIMIZE_MAX_MEMORY_SIZE
+        )
+        image.save(
+            optimized_file,
+            **save_kwargs
+        )
+        return optimized_file
+
+
+class TinyPNGCompressor(BaseCompressor):
+    """Compresses images with TinyPNG, if an api key is set."""
+
+    def compress(self, data, extension):
+        client = get_tinypng_client()
+
+        if not (
+                client
+                and extension.lower()
+                in TINYPNG_ALLOWED_EXTENSIONS
+        ):
+            return None
+
+        data.seek(0)
+        # an upload is read into memory only for the time of a request,
+        # so it's not kept together with a compressed image
+        return client.compress_or_none(data.file.read())
+
+
+class PillowCompressor(BaseCompressor):
+    """
+    Re-encodes images with Pillow. Options are passed to `Image.save`
+    and override default ones, e.g.:
+
+        ('ok_images.compressors.PillowCompressor', {
+            'lossless': False,
+            'method': 6
+        })
+    """
+
+    def __init__(self, **save_kwargs):
+        self.save_kwargs = save_kwargs
+
+    def compress(self, data, extension):
+        if extension.lower() not in IMAGE_ALLOWED_EXTENSIONS:
+            return None
+
+        lossless = is_lossless_webp(data)
+        image = self.open_image(data)
+
+        # hidden webp image
+        if isinstance(image, WebPImageFile) and extension.lower() != 'webp':
+            new_name = data.name.rsplit('.', 1)[0] + '.webp'
+            data.name = new_name
+            extension = 'WEBP'
+
+        image = remove_alpha(image, extension)
+
+        save_kwargs = {
+            'format': extension,
+            'optimize': True,
+            'quality': IMAGE_OPTIMIZE_QUALITY,
+        }
+
+        if extension == 'WEBP':
+            # lossy images would grow with lossless encoding
+            save_kwargs['lossless'] = lossless
+        elif extension == 'JPEG':
+            save_kwargs['progressive'] = True
+
+        save_kwargs.update(self.save_kwargs)
+        return self.save_image(image, **save_kwargs)
+
+
+class PillowQuantizeCompressor(BaseCompressor):
+    """
+    Reduces PNG images to a palette of up to `colors` colors with
+    dithering, like pngquant and TinyPNG do. Uses libimagequant,
+    if Pillow is built with it. Skips an image, which doesn't get smaller.
+    """
+
+    def __init__(self, colors=256, dither=True):
+        self.colors = colors
+        self.dither = dither
+
+    def get_method(self, image):
+        if features.check('libimagequant'):
+            return Image.LIBIMAGEQUANT
+
+        if image.mode == 'RGBA':
+            return Image.FASTOCTREE
+
+        return Image.MEDIANCUT
+
+    def compress(self, data, extension):
+        if extension != 'PNG':
+            return None
+
+        image = self.get_image(data, extension)
+
+        # already a palette image
+        if image.mode == 'P':
+            return None
+
+        if image.mode not in ('RGB', 'RGBA'):
+            image = image.convert('RGBA' if 'A' in image.mode else 'RGB')
+
+        image = image.quantize(
+            colors=self.colors,
+            method=self.get_method(image),
+            dither=Image.FLOYDSTEINBERG if self.dither else Image.NONE
+        )
+        optimized_file = self.save_image(image, format='PNG', optimize=True)
+
+        # a next compressor is tried, if a palette doesn't pay off
+        # (e.g. for smooth gradients)
+        if optimized_file.tell() >= data.size:
+            optimized_file.close()
+            return None
+
+        return optimized_file
+
+
+class AdaptiveQualityCompressor(PillowCompressor):
+    """
+    Re-encodes JPEG and lossy WebP images with adaptive quality
+    (see `ok_images.quality.AdaptiveQuality`), e.g.:
+
+        ('ok_images.compressors.AdaptiveQualityCompressor', {
+            'min_ssim': 0.98,
+            'max_bytes': 500 * 1024
+        })
+
+    Other options are passed to `Image.save` like `PillowCompressor` does.
+    """
+
+    def __init__(self, max_bytes=None, min_ssim=None, min_quality=40,
+                 max_quality=95, max_iterations=6, **save_kwargs):
+        save_kwargs.setdefault('lossless', False)
+        super().__init__(**save_kwargs)
+        self.adaptive_quality = AdaptiveQuality(
+            max_bytes=max_bytes,
+            min_ssim=min_ssim,
+            min_quality=min_quality,
+            max_quality=max_quality,
+            max_iterations=max_iterations
+        )
+
+    def save_image(self, image, **save_kwargs):
+        if not self.adaptive_quality.is_supported(save_kwargs):
+            return super().save_image(image, **save_kwargs)
+
+        return self.adaptive_quality.encode(image, save_kwargs)
+
+
+class CommandCompressor(BaseCompressor):
+    """
+    Pipes an image through a local command, which reads an image
+    from stdin and writes a compressed one to stdout, e.g.:
+
+        ('ok_images.compressors.CommandCompressor', {
+            'command': ['pngquant', '--quality=65-80', '-'],
+            'formats': ['PNG']
+        })
+    """
+
+    def __init__(self, command, formats=None, timeout=60):
+        self.command = command
+        self.formats = formats
+        self.timeout = timeout
+
+    def compress(self, data, extension):
+        if self.formats and extension not in self.formats:
+            return None
+
+        data.seek(0)
+
+        try:
+            process = subprocess.run(  # nosec
+                self.command,
+                input=data.read(),
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+                timeout=self.timeout,
+                check=True
+            )
+        except (OSError, subprocess.SubprocessError) as e:
+            logger.error(f'{self.command[0]} error: {e}')
+            return None
+
+        return process.stdout or None
+
+
+@lru_cache(maxsize=None)
+def get_compressors(extension):
+    """
+    Return compressors of a format from `IMAGE_COMPRESSORS` or
+    `IMAGE_DEFAULT_COMPRESSORS`. A compressor is set by an import path
+    or by an import path and options.
+    """
+    compressors = []
+
+    for compressor in IMAGE_COMPRESSORS.get(
+            extension,
+            IMAGE_DEFAULT_COMPRESSORS
+    ):
+        path, options = (
+            (compressor, {})
+            if isinstance(compressor, str)
+            else compressor
+        )
+        compressors.append(import_string(path)(**options))
+
+    return compressors
@@ -8,14 +8,39 @@ __all__ = (
     'IMAGE_RENDITION_KEY_SETS',
     'IMAGE_DEFAULT_RENDITION_KEY_SET',
     'IMAGE_OPTIMIZE_QUALITY',
+    'IMAGE_OPTIMIZE_MAX_MEMORY_SIZE',
+    'IMAGE_OPTIMIZE_MIN_GAIN',
+    'IMAGE_COMPRESSORS',
+    'IMAGE_DEFAULT_COMPRESSORS',
+    'IMAGE_DEFERRED_OPTIMIZATION',
+    'IMAGE_DEDUPLICATE',
     'IMAGE_CREATE_ON_DEMAND',
+    'IMAGE_LAZY_VARIATIONS',
+    'IMAGE_ASYNC_RENDITIONS',
+    'IMAGE_RENDITIONS_BACKEND',
+    'IMAGE_RENDITIONS_BACKEND_OPTIONS',
+    'IMAGE_RENDITION_LOCK_TIMEOUT',
+    'IMAGE_RENDITION_LOCK_WAIT',
+    'IMAGE_RENDITION_INDEX',
+    'IMAGE_RENDITION_PATH_CACHE_SIZE',
+    'IMAGE_METRICS',
+    'IMAGE_METRICS_OPTIONS',
+    'IMAGE_ADAPTIVE_QUALITY',
     'IMAGE_PLACEHOLDER_PATH',
     'IMAGE_RGBA_CHANGE_BACKGROUND',
     'IMAGE_LOSSLESS',
+    'IMAGE_REDUCED_DECODE_FACTOR',
+    'IMAGE_MAX_PIXELS',
     'TINYPNG_ALLOWED_EXTENSIONS',
     'TINYPNG_API_KEY_FUNCTION',
     'TINYPNG_API_KEY',
-    'OLD_IMAGE_FILE_KEY'
+    'TINYPNG_API_KEY_CACHE_TIMEOUT',
+    'TINYPNG_API_URL',
+    'TINYPNG_CLIENT_OPTIONS',
+    'OLD_IMAGE_FILE_KEY',
+    'ADMIN_PREVIEW_SIZE_KEY',
+    'WARM_IMAGES_ON_SAVE_KEY',
+    'OPTIMIZE_IMAGE_ON_SAVE_KEY'
 )
 
 
@@ -48,26 +73,156 @@ IMAGE_OPTIMIZE_QUALITY = getattr(
     75
 )
 
+# optimized images, which are bigger, are spooled to a temporary file
+IMAGE_OPTIMIZE_MAX_MEMORY_SIZE = getattr(
+    settings,
+    'IMAGE_OPTIMIZE_MAX_MEMORY_SIZE',
+    settings.FILE_UPLOAD_MAX_MEMORY_SIZE
+)
+
+# compressors of image formats (e.g. `JPEG`, `PNG`), tried in order
+IMAGE_COMPRESSORS = getattr(
+    settings,
+    'IMAGE_COMPRESSORS',
+    {}
+)
+
+IMAGE_DEFAULT_COMPRESSORS = getattr(
+    settings,
+    'IMAGE_DEFAULT_COMPRESSORS',
+    [
+        'ok_images.compressors.TinyPNGCompressor',
+        'ok_images.compressors.PillowCompressor',
+    ]
+)
+
+# an optimized upload or stored image replaces the original, only if
+# it's smaller at least by this part of the original size
+IMAGE_OPTIMIZE_MIN_GAIN = getattr(
+    settings,
+    'IMAGE_OPTIMIZE_MIN_GAIN',
+    0.05
+)
+
+IMAGE_DEFERRED_OPTIMIZATION = getattr(
+    settings,
+    'IMAGE_DEFERRED_OPTIMIZATION',
+    False
+)
+
+IMAGE_DEDUPLICATE = getattr(
+    settings,
+    'IMAGE_DEDUPLICATE',
+    False
+)
+
 IMAGE_CREATE_ON_DEMAND = getattr(
     settings,
     'IMAGE_CREATE_ON_DEMAND',
     VERSATILEIMAGEFIELD_CREATE_ON_DEMAND
 )
 
+IMAGE_LAZY_VARIATIONS = getattr(
+    settings,
+    'IMAGE_LAZY_VARIATIONS',
+    False
+)
+
+IMAGE_ASYNC_RENDITIONS = getattr(
+    settings,
+    'IMAGE_ASYNC_RENDITIONS',
+    False
+)
+
+IMAGE_RENDITIONS_BACKEND = getattr(
+    settings,
+    'IMAGE_RENDITIONS_BACKEND',
+    'ok_images.tasks.ThreadPoolBackend'
+)
+
+IMAGE_RENDITIONS_BACKEND_OPTIONS = getattr(
+    settings,
+    'IMAGE_RENDITIONS_BACKEND_OPTIONS',
+    {}
+)
+
+IMAGE_RENDITION_LOCK_TIMEOUT = getattr(
+    settings,
+    'IMAGE_RENDITION_LOCK_TIMEOUT',
+    60  # seconds
+)
+
+IMAGE_RENDITION_LOCK_WAIT = getattr(
+    settings,
+    'IMAGE_RENDITION_LOCK_WAIT',
+    5  # seconds
+)
+
+IMAGE_RENDITION_INDEX = getattr(
+    settings,
+    'IMAGE_RENDITION_INDEX',
+    'ok_images.index.StorageRenditionIndex'
+)
+
+# paths and urls of renditions of this number of source images
+# are kept in memory, `0` disables it
+IMAGE_RENDITION_PATH_CACHE_SIZE = getattr(
+    settings,
+    'IMAGE_RENDITION_PATH_CACHE_SIZE',
+    10000
+)
+
+IMAGE_METRICS = getattr(
+    settings,
+    'IMAGE_METRICS',
+    'ok_images.metrics.NullMetrics'
+)
+
+IMAGE_METRICS_OPTIONS = getattr(
+    settings,
+    'IMAGE_METRICS_OPTIONS',
+    {}
+)
+
+# options of adaptive quality of JPEG and WebP renditions
+# by a rendition key set name (see `ok_images.quality.AdaptiveQuality`)
+IMAGE_ADAPTIVE_QUALITY = getattr(
+    settings,
+    'IMAGE_ADAPTIVE_QUALITY',
+    {}
+)
+
 IMAGE_PLACEHOLDER_PATH = getattr(
     settings,
     'IMAGE_PLACEHOLDER_PATH',
     None
 )
 
+# transparent images are composed on a white (`True`) or a given
+# background color (e.g. '#F5F5F5') on optimization
 IMAGE_RGBA_CHANGE_BACKGROUND = getattr(
     settings,
-    'IMAGE_PLACEHOLDER_PATH',
+    'IMAGE_RGBA_CHANGE_BACKGROUND',
     False
 )
 
 IMAGE_LOSSLESS = getattr(settings, 'IMAGE_LOSSLESS', False)
 
+# JPEG sources are decoded at 1/2, 1/4 or 1/8 scale, if a decoded image
+# is still at least this times bigger than a rendition, `None` disables it
+IMAGE_REDUCED_DECODE_FACTOR = getattr(
+    settings,
+    'IMAGE_REDUCED_DECODE_FACTOR',
+    2
+)
+
+# images with more pixels aren't accepted and decoded
+IMAGE_MAX_PIXELS = getattr(
+    settings,
+    'IMAGE_MAX_PIXELS',
+    50 * 1000 * 1000
+)
+
 TINYPNG_ALLOWED_EXTENSIONS = ['jpeg', 'jpg', 'png']
 
 TINYPNG_API_KEY_FUNCTION = getattr(
@@ -82,5 +237,30 @@ TINYPNG_API_KEY = getattr(
     None
 )
 
+TINYPNG_API_KEY_CACHE_TIMEOUT = getattr(
+    settings,
+    'TINYPNG_API_KEY_CACHE_TIMEOUT',
+    5 * 60
+)
+
+TINYPNG_API_URL = getattr(
+    settings,
+    'TINYPNG_API_URL',
+    'https://api.tinify.com'
+)
+
+TINYPNG_CLIENT_OPTIONS = getattr(
+    settings,
+    'TINYPNG_CLIENT_OPTIONS',
+    {}
+)
+
 OLD_IMAGE_FILE_KEY = '_old_image_file'
 
+# a preview of `versatileimagefield` admin widget
+ADMIN_PREVIEW_SIZE_KEY = 'thumbnail__300x300'
+
+WARM_IMAGES_ON_SAVE_KEY = '_warm_images_on_save'
+
+OPTIMIZE_IMAGE_ON_SAVE_KEY = '_optimize_image_on_save'
+
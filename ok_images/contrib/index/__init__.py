@@ -0,0 +1 @@
+default_app_config = 'ok_images.contrib.index.apps.RenditionIndexConfig'
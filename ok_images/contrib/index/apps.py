@@ -0,0 +1,13 @@
+from django.apps import AppConfig
+from django.utils.translation import gettext_lazy as _
+
+__all__ = (
+    'RenditionIndexConfig',
+)
+
+
+class RenditionIndexConfig(AppConfig):
+    name = 'ok_images.contrib.index'
+    label = 'ok_images_index'
+    default_auto_field = 'django.db.models.AutoField'
+    verbose_name = _('Rendition index')
@@ -0,0 +1,71 @@
+from ...index import BaseRenditionIndex
+
+__all__ = (
+    'DatabaseRenditionIndex',
+)
+
+
+class DatabaseRenditionIndex(BaseRenditionIndex):
+    """
+    Keeps names of created renditions and optimized images
+    in database tables, so their existence is checked without
+    storage requests.
+    """
+
+    @property
+    def queryset(self):
+        from .models import StoredRendition
+
+        return StoredRendition.objects.all()
+
+    @property
+    def optimized_queryset(self):
+        from .models import OptimizedImage
+
+        return OptimizedImage.objects.all()
+
+    def exists(self, storage, name):
+        return self.queryset.filter(name=name).exists()
+
+    def filter_existing(self, storage, names):
+        return set(
+            self.queryset
+            .filter(name__in=list(names))
+            .values_list('name', flat=True)
+        )
+
+    def add(self, storage, name, source_name):
+        self.queryset.get_or_create(
+            name=name,
+            defaults={'source_name': source_name}
+        )
+
+    def remove(self, storage, names):
+        self.queryset.filter(name__in=list(names)).delete()
+
+    def filter_optimized(self, storage, names):
+        return set(
+            self.optimized_queryset
+            .filter(name__in=list(names))
+            .values_list('name', flat=True)
+        )
+
+    def add_optimized(self, storage, name):
+        self.optimized_queryset.get_or_create(name=name)
+
+    def remove_optimized(self, storage, names):
+        self.optimized_queryset.filter(name__in=list(names)).delete()
+
+    def get_renditions(self, storage, source_name):
+        names = list(
+            self.queryset
+            .filter(source_name=source_name)
+            .values_list('name', flat=True)
+        )
+        # renditions of filtered images (e.g. filters__to_webp__crop)
+        names += (
+            self.queryset
+            .filter(source_name__in=names)
+            .values_list('name', flat=True)
+        )
+        return names
@@ -0,0 +1,25 @@
+# Generated by Django 3.2.25 on 2026-10-16 23:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ok_images_index', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OptimizedImage',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255, unique=True, verbose_name='Name')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Created at')),
+            ],
+            options={
+                'verbose_name': 'optimized image',
+                'verbose_name_plural': 'optimized images',
+            },
+        ),
+    ]
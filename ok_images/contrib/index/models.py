@@ -0,0 +1,65 @@
+from django.db import models
+from django.utils.translation import gettext_lazy as _
+
+__all__ = (
+    'StoredRendition',
+    'OptimizedImage',
+)
+
+
+class StoredRendition(models.Model):
+    """
+    Created rendition of an image.
+
+    Attrs:
+        name (CharField): path of a rendition on storage
+        source_name (CharField): path of an image, a rendition is created from
+        created_at (DateTimeField): date of creation
+    """
+    name = models.CharField(
+        _('Name'),
+        max_length=255,
+        unique=True
+    )
+    source_name = models.CharField(
+        _('Source name'),
+        max_length=255,
+        db_index=True
+    )
+    created_at = models.DateTimeField(
+        _('Created at'),
+        auto_now_add=True
+    )
+
+    class Meta:
+        verbose_name = _('stored rendition')
+        verbose_name_plural = _('stored renditions')
+
+    def __str__(self):
+        return self.name
+
+
+class OptimizedImage(models.Model):
+    """
+    Marker of an optimized image, which is skipped on next optimization.
+
+    Attrs:
+        name (CharField): path of an image on storage
+        created_at (DateTimeField): date of optimization
+    """
+    name = models.CharField(
+        _('Name'),
+        max_length=255,
+        unique=True
+    )
+    created_at = models.DateTimeField(
+        _('Created at'),
+        auto_now_add=True
+    )
+
+    class Meta:
+        verbose_name = _('optimized image')
+        verbose_name_plural = _('optimized images')
+
+    def __str__(self):
+        return self.name
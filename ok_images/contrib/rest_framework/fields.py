@@ -8,7 +8,13 @@ __all__ = (
 class WebPVersatileImageFieldSerializer(VersatileImageFieldSerializer):
     def to_representation(self, value):
         data = super().to_representation(value)
+        # background renditions fall back to an original image
+        original_url = value.url if value else None
+
         for key, image_url in data.items():
+            if original_url and image_url.endswith(original_url):
+                continue
+
             if key.endswith('webp'):
                 name, ext = image_url.rsplit('.', 1)
                 data[key] = f'{name}.webp'
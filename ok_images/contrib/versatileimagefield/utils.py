@@ -1,7 +1,9 @@
 """
 Utils from versatileimagefield, modified to accept extensions
 """
+from collections import OrderedDict
 import os
+import threading
 
 from versatileimagefield.utils import (
     JPEG_QUAL as QUAL,
@@ -10,11 +12,16 @@ from versatileimagefield.utils import (
     VERSATILEIMAGEFIELD_FILTERED_DIRNAME
 )
 
+from ...consts import IMAGE_RENDITION_PATH_CACHE_SIZE
+
 __all__ = (
     'get_resized_filename',
     'get_resized_path',
     'get_filtered_filename',
-    'get_filtered_path'
+    'get_filtered_path',
+    'RenditionPathCache',
+    'rendition_paths',
+    'get_rendition_path_and_url',
 )
 
 
@@ -108,3 +115,88 @@ def get_filtered_path(path_to_image, ext, filename_key, storage):
     # Removing spaces so this path is memcached key friendly
     path_to_return = path_to_return.replace(' ', '')
     return path_to_return
+
+
+class RenditionPathCache:
+    """
+    Bounded LRU cache of (storage path, url) of renditions, grouped
+    by a source image name, so renditions of a changed source
+    are forgotten at once.
+    """
+
+    def __init__(self, maxsize=IMAGE_RENDITION_PATH_CACHE_SIZE):
+        self.maxsize = maxsize
+        self.sources = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, source, key):
+        with self.lock:
+            paths = self.sources.get(source)
+
+            if paths is None:
+                return None
+
+            self.sources.move_to_end(source)
+            return paths.get(key)
+
+    def set(self, source, key, value):
+        if not self.maxsize:
+            return
+
+        with self.lock:
+            paths = self.sources.get(source)
+
+            if paths is None:
+                paths = self.sources[source] = {}
+
+                if len(self.sources) > self.maxsize:
+                    self.sources.popitem(last=False)
+            else:
+                self.sources.move_to_end(source)
+
+            paths[key] = value
+
+    def invalidate(self, *sources):
+        """Forget renditions of source images."""
+        with self.lock:
+            for source in sources:
+                self.sources.pop(source, None)
+
+    def clear(self):
+        with self.lock:
+            self.sources.clear()
+
+
+rendition_paths = RenditionPathCache()
+
+
+def is_url_cacheable(storage):
+    # signed urls (e.g. of S3 with `querystring_auth`) expire
+    return not getattr(storage, 'querystring_auth', False)
+
+
+def get_rendition_path_and_url(storage, path_to_image, key, get_path):
+    """
+    Return (storage path, url) of a rendition of `path_to_image`.
+    `key` identifies a rendition of a source (e.g. a filename key, a size
+    and an extension), a path is built with `get_path` on a cache miss.
+    """
+    cache_key = (storage, *key)
+    value = rendition_paths.get(path_to_image, cache_key)
+
+    if value is not None:
+        path, url = value
+
+        if url is None:
+            url = storage.url(path)
+
+        return path, url
+
+    path = get_path()
+    url = storage.url(path)
+    rendition_paths.set(
+        path_to_image,
+        cache_key,
+        (path, url if is_url_cacheable(storage) else None)
+    )
+    return path, url
@@ -3,7 +3,6 @@ You need to import this file in any app in versatileimagefield.py file
 to make it visible for versatileimagefield
 """
 from PIL import Image
-from PIL.WebPImagePlugin import WebPImageFile
 
 from io import BytesIO
 
@@ -15,7 +14,10 @@ from versatileimagefield.datastructures.sizedimage import (
     SizedImageInstance
 )
 from versatileimagefield.registry import versatileimagefield_registry
-from versatileimagefield.utils import JPEG_QUAL as QUAL
+from versatileimagefield.utils import (
+    JPEG_QUAL as QUAL,
+    get_resized_path as get_default_resized_path
+)
 from versatileimagefield.versatileimagefield import (
     FilteredImage,
     CroppedImage as DefaultCroppedImage,
@@ -24,11 +26,20 @@ from versatileimagefield.versatileimagefield import (
 
 from .utils import (
     get_resized_path,
-    get_filtered_path
+    get_filtered_path,
+    get_rendition_path_and_url
 )
-from ...consts import IMAGE_LOSSLESS
+from ...consts import IMAGE_ASYNC_RENDITIONS, IMAGE_LOSSLESS
+from ...decoding import check_image_pixels, draft_image, get_decode_scale
+from ...index import get_rendition_index
+from ...locks import RenditionLock
+from ...metrics import increment, timer
+from ...quality import get_adaptive_quality
+from ...tasks import enqueue_filtered_image, enqueue_sized_image
 
 __all__ = (
+    'SourceImageMixin',
+    'SizedImageMixin',
     'WebPMixin',
     'ToWebPImage',
     'WebPThumbnailImage',
@@ -38,8 +49,189 @@ __all__ = (
 )
 
 
-class WebPMixin:
-    ext = "webp"
+class SourceImageMixin:
+    """
+    Takes an image from attached `source_image`
+    (see `ok_images.renditions.SourceImage`) instead of retrieving
+    and decoding it from storage for each rendition.
+
+    A JPEG image, retrieved from storage for a sized rendition,
+    is decoded at reduced scale (see `ok_images.decoding.draft_image`).
+    """
+    source_image = None
+    # crops cover a box of a rendition size, thumbnails fit into it
+    cover = False
+    rendition_size = None
+    # compiled size key of a rendition, which is being created
+    # (see `ok_images.renditions.create_rendition`)
+    size_key = None
+
+    def create_resized_image(self, path_to_image, save_path_on_storage,
+                             width, height):
+        self.rendition_size = (width, height)
+
+        try:
+            self.create_image(
+                path_to_image,
+                save_path_on_storage,
+                width=width,
+                height=height
+            )
+        finally:
+            self.rendition_size = None
+
+    def create_filtered_image(self, path_to_image, save_path_on_storage):
+        self.create_image(path_to_image, save_path_on_storage)
+
+    def create_image(self, path_to_image, save_path_on_storage,
+                     **process_kwargs):
+        """
+        Create a rendition like `versatileimagefield` does,
+        sending timings of each stage (see `ok_images.metrics`).
+        """
+        sizer = self.filename_key
+
+        with timer('rendition.create', sizer=sizer):
+            with timer('rendition.retrieve', sizer=sizer):
+                image, file_ext, image_format, mime_type = (
+                    self.retrieve_image(path_to_image)
+                )
+
+            with timer('rendition.process', sizer=sizer, format=image_format):
+                image, save_kwargs = self.preprocess(image, image_format)
+                imagefile = self.process_image(
+                    image=image,
+                    image_format=image_format,
+                    save_kwargs=save_kwargs,
+                    **process_kwargs
+                )
+
+            with timer('rendition.save', sizer=sizer):
+                self.save_image(
+                    imagefile, save_path_on_storage, file_ext, mime_type
+                )
+
+    def get_decode_scale(self, image_size, width, height):
+        return get_decode_scale(image_size, (width, height), cover=self.cover)
+
+    def draft_image(self, image):
+        if self.rendition_size is not None:
+            draft_image(
+                image,
+                self.get_decode_scale(image.size, *self.rendition_size)
+            )
+
+        return image
+
+    def save_image(self, imagefile, save_path, file_ext, mime_type):
+        super().save_image(imagefile, save_path, file_ext, mime_type)
+        get_rendition_index().add(self.storage, save_path, self.path_to_image)
+
+    def encode_image(self, image, save_kwargs, size_key):
+        """
+        Encode a rendition with adaptive quality of its key set
+        (see `ok_images.quality`) or with a quality of `save_kwargs`.
+        """
+        adaptive_quality = get_adaptive_quality(size_key)
+
+        if adaptive_quality and adaptive_quality.is_supported(save_kwargs):
+            return adaptive_quality.encode(image, save_kwargs)
+
+        imagefile = BytesIO()
+        image.save(imagefile, **save_kwargs)
+        return imagefile
+
+    def get_source_image(self, path_to_image):
+        source_image = self.source_image
+
+        if source_image is not None and source_image.name == path_to_image:
+            return source_image
+
+        return None
+
+    def retrieve_image(self, path_to_image):
+        source_image = self.get_source_image(path_to_image)
+
+        if source_image is None:
+            image, *metadata = super().retrieve_image(path_to_image)
+            check_image_pixels(image)
+            return (self.draft_image(image), *metadata)
+
+        return (
+            source_image.copy(),
+            source_image.file_ext,
+            source_image.image_format,
+            source_image.mime_type
+        )
+
+
+class SizedImageMixin(SourceImageMixin):
+    """
+    Sizer, which creates a missing rendition once among concurrent
+    workers (see `ok_images.locks.RenditionLock`) or in background,
+    if `IMAGE_ASYNC_RENDITIONS` is enabled (see `ok_images.tasks`),
+    and returns an original image url until it's created.
+    """
+
+    def get_resized_path(self, width, height):
+        return get_default_resized_path(
+            path_to_image=self.path_to_image,
+            width=width,
+            height=height,
+            filename_key=self.get_filename_key(),
+            storage=self.storage
+        )
+
+    def get_size_key(self, width, height):
+        if self.size_key is not None:
+            return self.size_key.size_key
+
+        # a sizer, accessed directly, doesn't know a filter it's bolted on
+        return f'{self.filename_key}__{width}x{height}'
+
+    def get_resized_path_and_url(self, width, height):
+        """Return a memoized (storage path, url) of a rendition."""
+        return get_rendition_path_and_url(
+            self.storage,
+            self.path_to_image,
+            (
+                self.get_filename_key(),
+                width,
+                height,
+                getattr(self, 'ext', None)
+            ),
+            lambda: self.get_resized_path(width, height)
+        )
+
+    def create_resized_image_once(self, name, width, height):
+        """
+        Create a missing rendition by a single one of concurrent workers.
+        Return `False`, if it's not created yet: it's enqueued in async mode
+        or another worker creates it longer than `IMAGE_RENDITION_LOCK_WAIT`.
+        """
+        if IMAGE_ASYNC_RENDITIONS:
+            enqueue_sized_image(self, name, width, height)
+            return False
+
+        index = get_rendition_index()
+        lock = RenditionLock(name)
+
+        if not lock.acquire():
+            return lock.wait() and index.exists(self.storage, name)
+
+        try:
+            # it could be created, while the lock was being acquired
+            if not index.discover(self.storage, name, self.path_to_image):
+                self.create_resized_image(
+                    path_to_image=self.path_to_image,
+                    save_path_on_storage=name,
+                    width=width,
+                    height=height
+                )
+        finally:
+            lock.release()
+
+        return True
 
     def __getitem__(self, key):
         """
@@ -65,18 +257,12 @@ class WebPMixin:
             resized_url = "http://placehold.it/%dx%d" % (width, height)
             resized_storage_path = resized_url
         else:
-            resized_storage_path = get_resized_path(
-                path_to_image=self.path_to_image,
-                ext=self.ext,
-                width=width,
-                height=height,
-                filename_key=self.get_filename_key(),
-                storage=self.storage
-            )
-
             try:
-                resized_url = self.storage.url(resized_storage_path)
+                resized_storage_path, resized_url = (
+                    self.get_resized_path_and_url(width, height)
+                )
             except Exception:
+                resized_storage_path = self.get_resized_path(width, height)
                 resized_url = None
 
             if self.create_on_demand is True:
@@ -84,17 +270,30 @@ class WebPMixin:
                     # The sized path exists in the cache so the image already
                     # exists. So we `pass` to skip directly to the return
                     # statement
-                    pass
+                    increment(
+                        'rendition.cache', sizer=self.filename_key, result='hit'
+                    )
                 else:
-                    if resized_storage_path and not self.storage.exists(
-                        resized_storage_path
+                    increment(
+                        'rendition.cache',
+                        sizer=self.filename_key,
+                        result='miss'
+                    )
+                    index = get_rendition_index()
+
+                    if resized_storage_path and not index.exists(
+                        self.storage, resized_storage_path
                     ):
-                        self.create_resized_image(
-                            path_to_image=self.path_to_image,
-                            save_path_on_storage=resized_storage_path,
-                            width=width,
-                            height=height
-                        )
+                        if not self.create_resized_image_once(
+                            resized_storage_path, width, height
+                        ):
+                            # return the original until a rendition
+                            # is created
+                            return SizedImageInstance(
+                                name=resized_storage_path,
+                                url=self.storage.url(self.path_to_image),
+                                storage=self.storage
+                            )
 
                         resized_url = self.storage.url(resized_storage_path)
 
@@ -107,11 +306,33 @@ class WebPMixin:
             storage=self.storage
         )
 
+
+class WebPMixin(SourceImageMixin):
+    ext = "webp"
+
+    def get_resized_path(self, width, height):
+        return get_resized_path(
+            path_to_image=self.path_to_image,
+            ext=self.ext,
+            width=width,
+            height=height,
+            filename_key=self.get_filename_key(),
+            storage=self.storage
+        )
+
     def retrieve_image(self, path_to_image):
-        image = self.storage.open(path_to_image, "rb")
+        source_image = self.get_source_image(path_to_image)
+
+        if source_image is None:
+            image = Image.open(self.storage.open(path_to_image, "rb"))
+            check_image_pixels(image)
+            image = self.draft_image(image)
+        else:
+            image = source_image.copy()
+
         file_ext = self.ext
         image_format, mime_type = "WEBP", "image/webp"
-        return Image.open(image), file_ext, image_format, mime_type
+        return image, file_ext, image_format, mime_type
 
     def save_image(self, imagefile, save_path, file_ext, mime_type):
         path, ext = save_path.rsplit('.', 1)
@@ -127,33 +348,96 @@ class ToWebPImage(WebPMixin, FilteredImage):
     object.image.filters.to_webp.url
     """
     def __init__(self, path_to_image, storage, create_on_demand, filename_key):
-        super().__init__(
-            path_to_image, storage, create_on_demand, filename_key
+        # a path and an url of `FilteredImage` are replaced
+        # by webp ones, so they aren't built
+        super(FilteredImage, self).__init__(
+            path_to_image, storage, create_on_demand
         )
-        self.name = get_filtered_path(
-            path_to_image=self.path_to_image,
-            ext=self.ext,
-            filename_key=filename_key,
-            storage=storage
+        self.filename_key = filename_key
+        self.name, self.url = get_rendition_path_and_url(
+            storage,
+            self.path_to_image,
+            (filename_key, self.ext),
+            lambda: get_filtered_path(
+                path_to_image=self.path_to_image,
+                ext=self.ext,
+                filename_key=filename_key,
+                storage=storage
+            )
+        )
+
+        if self.is_async and not (
+            self.is_cached()
+            or get_rendition_index().exists(storage, self.name)
+        ):
+            enqueue_filtered_image(self, filename_key)
+            # return the original until a rendition is created in background
+            self.url = storage.url(self.path_to_image)
+
+    def is_cached(self):
+        is_cached = bool(cache.get(self.url))
+        increment(
+            'rendition.cache',
+            sizer=self.filename_key,
+            result='hit' if is_cached else 'miss'
         )
+        return is_cached
 
-        self.url = storage.url(self.name)
+    @property
+    def is_async(self):
+        return IMAGE_ASYNC_RENDITIONS and self.create_on_demand
+
+    def create_filtered_image(self, path_to_image, save_path_on_storage):
+        if self.create_on_demand:
+            # filter library checks existence of a filtered image
+            # with an original extension, so check the webp one here
+            self.create_filtered_image_once()
+        else:
+            super().create_filtered_image(path_to_image, save_path_on_storage)
+
+    def create_filtered_image_once(self):
+        """
+        Create a missing rendition by a single one of concurrent workers
+        (it's enqueued in `__init__` in async mode) and fall back
+        to an original image url until it's created.
+        """
+        index = get_rendition_index()
+
+        if self.is_async or index.exists(self.storage, self.name):
+            return
+
+        lock = RenditionLock(self.name)
+
+        if not lock.acquire():
+            if not (lock.wait() and index.exists(self.storage, self.name)):
+                # return the original until a rendition is created
+                self.url = self.storage.url(self.path_to_image)
+
+            return
+
+        try:
+            if not index.discover(self.storage, self.name, self.path_to_image):
+                super().create_filtered_image(self.path_to_image, self.name)
+        finally:
+            lock.release()
 
     def process_image(self, image, image_format, save_kwargs):
-        imagefile = BytesIO()
         image, save_kwargs = self.preprocess(image, "WEBP")
-        image.save(imagefile, **save_kwargs)
-        return imagefile
+        size_key = (
+            self.size_key.size_key
+            if self.size_key is not None
+            else f'filters__{self.filename_key}__url'
+        )
+        return self.encode_image(image, save_kwargs, size_key)
 
 
-class WebPThumbnailImage(WebPMixin, DefaultThumbnailImage):
+class WebPThumbnailImage(WebPMixin, SizedImageMixin, DefaultThumbnailImage):
     """
     object.image.thumbnail_webp['512x511'].url
     """
     filename_key = "thumbnail_webp"
 
     def process_image(self, image, image_format, save_kwargs, width, height):
-        imagefile = BytesIO()
         image.thumbnail(
             (width, height),
             Image.ANTIALIAS
@@ -161,23 +445,21 @@ class WebPThumbnailImage(WebPMixin, DefaultThumbnailImage):
 
         image, save_kwargs = self.preprocess(image, "WEBP")
 
-        image.save(
-            imagefile,
-            **save_kwargs
+        return self.encode_image(
+            image, save_kwargs, self.get_size_key(width, height)
         )
-        return imagefile
 
 
-class WebPCroppedImage(WebPMixin, DefaultCroppedImage):
+class WebPCroppedImage(WebPMixin, SizedImageMixin, DefaultCroppedImage):
     """
     object.image.crop_webp['512x511'].url
     """
     filename_key = "crop_webp"
     filename_key_regex = r'crop_webp-c[0-9-]+__[0-9-]+'
+    cover = True
 
     def process_image(self, image, image_format, save_kwargs,
                       width, height):
-        imagefile = BytesIO()
         palette = image.getpalette()
         cropped_image = self.crop_on_centerpoint(
             image,
@@ -193,15 +475,14 @@ class WebPCroppedImage(WebPMixin, DefaultCroppedImage):
 
         cropped_image, save_kwargs = self.preprocess(cropped_image, "WEBP")
 
-        cropped_image.save(
-            imagefile,
-            **save_kwargs
+        return self.encode_image(
+            cropped_image, save_kwargs, self.get_size_key(width, height)
         )
 
-        return imagefile
 
+class CroppedImage(SizedImageMixin, DefaultCroppedImage):
+    cover = True
 
-class CroppedImage(DefaultCroppedImage):
     def process_image(self, image, image_format, save_kwargs,
                       width, height):
         """
@@ -211,7 +492,6 @@ class CroppedImage(DefaultCroppedImage):
         and then crop inwards centered on the Primary Point of Interest
         (as specified by `self.ppoi`)
         """
-        imagefile = BytesIO()
         palette = image.getpalette()
         cropped_image = self.crop_on_centerpoint(
             image,
@@ -225,18 +505,16 @@ class CroppedImage(DefaultCroppedImage):
         if image_format == 'GIF':
             cropped_image.putpalette(palette)
 
-        if isinstance(image, WebPImageFile):
+        # webp sources are saved as JPEG
+        if image_format == 'WEBP':
             save_kwargs['format'] = 'JPEG'
 
-        cropped_image.save(
-            imagefile,
-            **save_kwargs
+        return self.encode_image(
+            cropped_image, save_kwargs, self.get_size_key(width, height)
         )
 
-        return imagefile
-
 
-class ThumbnailImage(DefaultThumbnailImage):
+class ThumbnailImage(SizedImageMixin, DefaultThumbnailImage):
     def process_image(self, image, image_format, save_kwargs,
                       width, height):
         """
@@ -244,20 +522,18 @@ class ThumbnailImage(DefaultThumbnailImage):
 
         Bounding box dimensions are `width`x`height`.
         """
-        imagefile = BytesIO()
         image.thumbnail(
             (width, height),
             Image.ANTIALIAS
         )
 
-        if isinstance(image, WebPImageFile):
+        # webp sources are saved as JPEG
+        if image_format == 'WEBP':
             save_kwargs['format'] = 'JPEG'
 
-        image.save(
-            imagefile,
-            **save_kwargs
+        return self.encode_image(
+            image, save_kwargs, self.get_size_key(width, height)
         )
-        return imagefile
 
 
 versatileimagefield_registry.register_filter('to_webp', ToWebPImage)
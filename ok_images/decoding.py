@@ -0,0 +1,60 @@
+from math import ceil
+from PIL import Image
+
+from .consts import IMAGE_MAX_PIXELS, IMAGE_REDUCED_DECODE_FACTOR
+
+__all__ = (
+    'get_decode_scale',
+    'draft_image',
+    'check_image_pixels',
+)
+
+
+def get_decode_scale(image_size, size, cover=False):
+    """
+    Return a minimal scale to decode an image of `image_size` at
+    to create a rendition of `size`, which covers a box of `size` (crops)
+    or fits into it (thumbnails).
+    Both orientations are checked, because EXIF rotation is applied
+    after decoding.
+    """
+    image_width, image_height = image_size
+    width, height = size
+    choose = max if cover else min
+
+    return max(
+        choose(width / image_width, height / image_height),
+        choose(width / image_height, height / image_width)
+    )
+
+
+def draft_image(image, scale):
+    """
+    Make a not yet loaded JPEG image decode at the smallest of
+    1/2, 1/4 or 1/8 scale, which is still `IMAGE_REDUCED_DECODE_FACTOR`
+    times bigger than a required `scale`, instead of full resolution.
+    """
+    if not IMAGE_REDUCED_DECODE_FACTOR or image.format != 'JPEG':
+        return
+
+    scale *= IMAGE_REDUCED_DECODE_FACTOR
+
+    if scale >= 1:
+        return
+
+    width, height = image.size
+    image.draft(image.mode, (ceil(width * scale), ceil(height * scale)))
+
+
+def check_image_pixels(image):
+    """
+    Raise `DecompressionBombError` for a not yet loaded image with more
+    than `IMAGE_MAX_PIXELS` pixels, before it's decoded.
+    """
+    width, height = image.size
+
+    if IMAGE_MAX_PIXELS and width * height > IMAGE_MAX_PIXELS:
+        raise Image.DecompressionBombError(
+            f'Image size ({width * height} pixels) exceeds limit '
+            f'of {IMAGE_MAX_PIXELS} pixels.'
+        )
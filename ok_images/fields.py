@@ -1,4 +1,5 @@
 from django.core.validators import FileExtensionValidator
+from django.db import transaction
 from django.db.models import signals
 
 from versatileimagefield.fields import VersatileImageField
@@ -8,13 +9,25 @@ from versatileimagefield.serializers import VersatileImageFieldSerializer
 from .consts import (
     IMAGE_ALLOWED_EXTENSIONS,
     IMAGE_MAX_FILE_SIZE,
+    IMAGE_MAX_PIXELS,
     IMAGE_CREATE_ON_DEMAND,
+    IMAGE_DEDUPLICATE,
+    IMAGE_DEFERRED_OPTIMIZATION,
+    IMAGE_LAZY_VARIATIONS,
     IMAGE_PLACEHOLDER_PATH,
-    OLD_IMAGE_FILE_KEY
+    OLD_IMAGE_FILE_KEY,
+    OPTIMIZE_IMAGE_ON_SAVE_KEY,
+    WARM_IMAGES_ON_SAVE_KEY
 )
 from .files import OptimizedVersatileImageFieldFile, OptimizedVersatileImageFileDescriptor
-from .utils import image_upload_to, image_optimizer
-from .validators import FileSizeValidator
+from .metrics import metric_tags
+from .tasks import enqueue_optimize_image
+from .utils import (
+    hashed_image_upload_to,
+    image_upload_to,
+    image_optimizer
+)
+from .validators import FileSizeValidator, MaxPixelsValidator
 
 __all__ = (
     'OptimizedImageField',
@@ -41,10 +54,21 @@ class OptimizedImageField(VersatileImageField):
             kwargs.pop('create_on_demand', IMAGE_CREATE_ON_DEMAND)
         )
         self.images_warmer = kwargs.pop('images_warmer', None)
+        self.lazy_variations = (
+            kwargs.pop('lazy_variations', IMAGE_LAZY_VARIATIONS)
+        )
+        self.deferred_optimization = (
+            kwargs.pop('deferred_optimization', IMAGE_DEFERRED_OPTIMIZATION)
+        )
+        self.deduplicate = kwargs.pop('deduplicate', IMAGE_DEDUPLICATE)
 
         super().__init__(*args, **kwargs)
         
-        self.upload_to = image_upload_to
+        self.upload_to = (
+            hashed_image_upload_to
+            if self.deduplicate
+            else image_upload_to
+        )
         self.validators.append(
             FileExtensionValidator(IMAGE_ALLOWED_EXTENSIONS)
         )
@@ -52,6 +76,11 @@ class OptimizedImageField(VersatileImageField):
         if not any([isinstance(v, FileSizeValidator) for v in self.validators]):
             self.validators.append(FileSizeValidator(max_size=IMAGE_MAX_FILE_SIZE))
 
+        if IMAGE_MAX_PIXELS and not any(
+                [isinstance(v, MaxPixelsValidator) for v in self.validators]
+        ):
+            self.validators.append(MaxPixelsValidator())
+
         if self.placeholder_image is None and IMAGE_PLACEHOLDER_PATH:
             self.placeholder_image = OnStoragePlaceholderImage(
                 path=IMAGE_PLACEHOLDER_PATH
@@ -71,14 +100,14 @@ class OptimizedImageField(VersatileImageField):
         )
 
         if field and field._committed:
-            sizes = (
-                self.image_sizes_serializer(
-                    sizes=image_sizes
-                )
-                .to_representation(
-                    field
+            with metric_tags(key_set=image_sizes.name):
+                sizes = (
+                    image_sizes
+                    .get_serializer(self.image_sizes_serializer)
+                    .to_representation(
+                        field
+                    )
                 )
-            )
         else:
             sizes = {
                 key: self.placeholder_image_name
@@ -97,9 +126,25 @@ class OptimizedImageField(VersatileImageField):
         if field:
             getattr(instance, self.name).delete(False)
 
+    def post_save_callback(self, sender, instance, **kwargs):
+        optimize_key = f'{OPTIMIZE_IMAGE_ON_SAVE_KEY}_{self.name}'
+        warm_key = f'{WARM_IMAGES_ON_SAVE_KEY}_{self.name}'
+        file = getattr(instance, self.name)
+
+        if instance.__dict__.pop(optimize_key, False):
+            # images are warmed after optimization
+            transaction.on_commit(lambda: enqueue_optimize_image(file))
+        elif instance.__dict__.pop(warm_key, False):
+            file.warm_in_background()
+
     def contribute_to_class(self, cls, name, **kwargs):
         super().contribute_to_class(cls, name, **kwargs)
-        signals.post_init.connect(self.set_variations, sender=cls)
+
+        # in lazy mode variations are resolved by the file on first access
+        if not self.lazy_variations:
+            signals.post_init.connect(self.set_variations, sender=cls)
+
+        signals.post_save.connect(self.post_save_callback, sender=cls)
         signals.post_delete.connect(self.post_delete_callback, sender=cls)
 
     def save_form_data(self, instance, data):
@@ -117,7 +162,15 @@ class OptimizedImageField(VersatileImageField):
             True if data_ and file != data_ else False
         )
 
-        if updating_image:
+        if updating_image and self.deferred_optimization:
+            # stored as is and optimized in background after saving
+            # (see `post_save_callback`)
+            setattr(
+                instance,
+                f'{OPTIMIZE_IMAGE_ON_SAVE_KEY}_{self.name}',
+                True
+            )
+        elif updating_image:
             # optimize data
             if isinstance(data, tuple):
                 optimized_data = image_optimizer(data_)
@@ -127,6 +180,16 @@ class OptimizedImageField(VersatileImageField):
 
         super().save_form_data(instance, data)
 
+    def generate_filename(self, instance, filename):
+        if not self.deduplicate:
+            return super().generate_filename(instance, filename)
+
+        # hashed names of deduplicated images are stored in a folder
+        # of the field (see `OptimizedVersatileImageFieldFile.is_shared`)
+        return self.storage.generate_filename(
+            hashed_image_upload_to(instance, filename, field_name=self.name)
+        )
+
     def pre_save(self, model_instance, add):
         # handle clear input here, because on input clear save method is not calling
         old_file = getattr(model_instance, f"{OLD_IMAGE_FILE_KEY}_{self.name}", None)
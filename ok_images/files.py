@@ -1,22 +1,59 @@
+import logging
 import os
 
-from django.core.cache import cache
 from django.db import transaction
 
 from versatileimagefield.files import VersatileImageFieldFile, VersatileImageFileDescriptor
-from versatileimagefield.utils import (
-    validate_versatileimagefield_sizekey_list,
-    get_rendition_key_set
+from versatileimagefield.settings import cache
+
+from .consts import (
+    ADMIN_PREVIEW_SIZE_KEY,
+    IMAGE_ASYNC_RENDITIONS,
+    OLD_IMAGE_FILE_KEY,
+    OPTIMIZE_IMAGE_ON_SAVE_KEY,
+    WARM_IMAGES_ON_SAVE_KEY
 )
+from .contrib.versatileimagefield.utils import rendition_paths
+from .index import get_rendition_index
+from .keysets import compile_size_key, get_key_set
+from .metrics import metric_tags
+from .renditions import create_renditions, get_rendition_names
+from .tasks import enqueue_warm_images
 
-from .consts import IMAGE_DEFAULT_RENDITION_KEY_SET, OLD_IMAGE_FILE_KEY
+logger = logging.getLogger(__name__)
 
 __all__ = (
     'OptimizedVersatileImageFileDescriptor',
     'OptimizedVersatileImageFieldFile',
+    'delete_files',
+    'get_deduplicated_name',
 )
 
 
+def delete_files(storage, names):
+    """
+    Delete files at once with `storage.delete_many(names)`,
+    if a storage provides it, or one by one.
+    """
+    delete_many = getattr(storage, 'delete_many', None)
+
+    if delete_many is not None:
+        delete_many(names)
+        return
+
+    for name in names:
+        storage.delete(name)
+
+
+def get_deduplicated_name(name, content):
+    """Return a name of a deduplicated image by a hash of its content."""
+    # utils import files, so they can't be imported on module level
+    from .utils import get_content_hash
+
+    ext = os.path.splitext(name)[1]
+    return f'{get_content_hash(content)}{ext}'
+
+
 class OptimizedVersatileImageFileDescriptor(VersatileImageFileDescriptor):
     def __set__(self, instance, value):
         return super().__set__(instance, value)
@@ -32,20 +69,79 @@ class OptimizedVersatileImageFieldFile(VersatileImageFieldFile):
         self.image_sizes = self.get_validated_image_sizes(self.instance, self.field.image_sizes)
         self._create_on_demand = self.field.create_on_demand
 
+        if self.field.lazy_variations:
+            self._lazy_image_sizes = dict(self.image_sizes)
+
+    def __getstate__(self):
+        state = super().__getstate__()
+        # a compiled key set is pickled by its name (see `KeySet`)
+        state['image_sizes'] = self.image_sizes
+        state['_create_on_demand'] = self._create_on_demand
+        state['_ppoi_value'] = self._ppoi_value
+
+        if '_lazy_image_sizes' in self.__dict__:
+            state['_lazy_image_sizes'] = self._lazy_image_sizes
+
+        return state
+
+    def __setstate__(self, state):
+        super().__setstate__(state)
+        self.image_sizes_serializer = self.field.image_sizes_serializer
+        # sizers and filters aren't pickled
+        self.build_filters_and_sizers(self._ppoi_value, self._create_on_demand)
+
+    def __getattr__(self, name):
+        """
+        Resolve variation attribute (e.g. `desktop_webp`) on first access
+        in lazy mode. Resolved url is memoized as an instance attribute,
+        so next lookups don't get here.
+        """
+        image_sizes = self.__dict__.get('_lazy_image_sizes')
+
+        if not image_sizes or name not in image_sizes:
+            raise AttributeError(
+                f"'{self.__class__.__name__}' object "
+                f"has no attribute '{name}'"
+            )
+
+        url = self.get_variation(name, image_sizes[name])
+        setattr(self, name, url)
+        return url
+
+    def get_variation(self, name, size_key):
+        if self and self._committed:
+            with metric_tags(key_set=self.image_sizes.name):
+                return (
+                    get_key_set([(name, size_key)])
+                    .get_serializer(self.field.image_sizes_serializer)
+                    .to_representation(
+                        self
+                    )
+                )[name]
+
+        return self.field.placeholder_image_name
+
+    def clear_variations(self):
+        """Forget variations, resolved in lazy mode."""
+        for name in self.__dict__.get('_lazy_image_sizes', {}):
+            self.__dict__.pop(name, None)
+
     @classmethod
     def get_validated_image_sizes(cls, instance, image_sizes=None):
-        image_sizes = (
+        """Return a compiled key set of a field, a model or the default."""
+        return get_key_set(
             image_sizes
             or getattr(instance, 'image_sizes', None)
-            or IMAGE_DEFAULT_RENDITION_KEY_SET
         )
 
-        if isinstance(image_sizes, str):
-            image_sizes = get_rendition_key_set(image_sizes)
-
-        image_sizes = validate_versatileimagefield_sizekey_list(image_sizes)
-
-        return image_sizes
+    def get_created_files(self, root_folder):
+        """
+        Return names of files in `root_folder` by listing storage,
+        so images of any sizes and filters are found, including ones,
+        created before the rendition index.
+        """
+        directory_list, file_list = self.storage.listdir(root_folder)
+        return file_list
 
     def delete_matching_files_from_storage(self, root_folder, regex):
         """
@@ -64,12 +160,13 @@ class OptimizedVersatileImageFieldFile(VersatileImageFieldFile):
             return
 
         try:
-            directory_list, file_list = self.storage.listdir(root_folder)
+            file_list = self.get_created_files(root_folder)
         except OSError:   # pragma: no cover
             pass
         else:
             folder, filename = os.path.split(self.name)
             basename, ext = os.path.splitext(filename)
+            names = []
 
             for f in file_list:
                 if not f.startswith(basename):   # pragma: no cover
@@ -79,22 +176,122 @@ class OptimizedVersatileImageFieldFile(VersatileImageFieldFile):
                 match = regex.match(tag)
 
                 if match is not None:
-                    file_location = os.path.join(root_folder, f)
-                    self.storage.delete(file_location)
+                    names.append(os.path.join(root_folder, f))
 
-                    cache.delete(
-                        self.storage.url(file_location)
-                    )
-                    print(
-                        "Deleted {file} (created from: {original})".format(
-                            file=os.path.join(root_folder, f),
-                            original=self.name
-                        )
-                    )
+            self.delete_created_images(names)
+
+    def get_created_image_names(self):
+        """
+        Return names of images, created from the image, without listing
+        storage: names of the rendition index and names, computed from
+        a rendition key set of the image and a preview of the admin widget,
+        which could be created before the index.
+        """
+        names = get_rendition_names(self, self.get_size_keys())
+        names.update(
+            get_rendition_index().get_renditions(self.storage, self.name)
+            or ()
+        )
+        return list(names)
+
+    def get_size_keys(self):
+        """
+        Return compiled size keys of the image and of the admin widget
+        preview.
+        """
+        return [
+            *self.image_sizes.compiled_keys,
+            compile_size_key(ADMIN_PREVIEW_SIZE_KEY)
+        ]
+
+    def delete_created_images(self, names):
+        """Delete images with a single storage, index and cache call."""
+        if not names:
+            return
+
+        delete_files(self.storage, names)
+        get_rendition_index().remove(self.storage, names)
+        cache.delete_many([self.storage.url(name) for name in names])
+        logger.info(
+            f'Deleted {len(names)} images created from {self.name}'
+        )
+
+    def delete_all_created_images(self, listdir=False):
+        """
+        Delete all images created from the image. Images of a rendition
+        key set and of the rendition index are deleted by default,
+        with `listdir` storage folders are listed to find images
+        of any sizes and filters.
+        """
+        if not self.name:
+            return
+
+        if listdir:
+            super().delete_all_created_images()
+            # forget indexed renditions, which weren't found on storage
+            self.delete_created_images(
+                get_rendition_index().get_renditions(self.storage, self.name)
+            )
+        else:
+            self.delete_created_images(self.get_created_image_names())
+
+        rendition_paths.invalidate(self.name)
+
+    @property
+    def is_shared(self):
+        """
+        Whether other instances reference the same deduplicated image,
+        so it and its renditions must be kept on deletion.
+        """
+        if not (self and self.field.deduplicate):
+            return False
+
+        return (
+            self.field.model._default_manager
+            .filter(**{self.field.attname: self.name})
+            .exclude(pk=self.instance.pk)
+            .exists()
+        )
 
     def delete(self, save=True):
-        self.delete_all_created_images()
-        super().delete(save=save)
+        if not self.is_shared:
+            self.delete_all_created_images()
+            get_rendition_index().remove_optimized(self.storage, [self.name])
+            super().delete(save=save)
+            return
+
+        # only forget the image, like `FieldFile.delete` does
+        if hasattr(self, '_file'):
+            self.close()
+            del self.file
+
+        self.name = None
+        setattr(self.instance, self.field.attname, self.name)
+        self._committed = False
+
+        if save:
+            self.instance.save()
+
+    def reuse_stored_file(self, name):
+        """
+        Point to a deduplicated image, which is already stored with
+        its renditions, instead of storing it again.
+        Return `False`, if an image isn't stored yet.
+        """
+        name = self.field.generate_filename(self.instance, name)
+
+        if not self.storage.exists(name):
+            return False
+
+        self.name = name
+        setattr(self.instance, self.field.attname, self.name)
+        self._committed = True
+        # a stored image is already optimized
+        self.instance.__dict__.pop(
+            f'{OPTIMIZE_IMAGE_ON_SAVE_KEY}_{self.field.name}',
+            None
+        )
+        return True
 
     def save(self, name, content, save=True):
         # delete old file on replace
@@ -103,26 +300,67 @@ class OptimizedVersatileImageFieldFile(VersatileImageFieldFile):
         if old_file:
             old_file.delete(save=False)
 
-        super().save(name, content, save)
+        if self.field.deduplicate:
+            # name by a content hash on every path (forms, serializers
+            # and `save`), so the same name always means the same image
+            name = get_deduplicated_name(name, content)
+
+        if self.field.deduplicate and self.reuse_stored_file(name):
+            if save:
+                self.instance.save()
+        else:
+            super().save(name, content, save)
+
+        self.clear_variations()
+
+        if hasattr(
+                self.instance,
+                f'{OPTIMIZE_IMAGE_ON_SAVE_KEY}_{self.field.name}'
+        ):
+            # images are warmed after deferred optimization
+            pass
+        elif self.is_warmed_in_background:
+            # warm images, when an instance is saved and has a primary key
+            # (see `OptimizedImageField.post_save_callback`)
+            setattr(
+                self.instance,
+                f'{WARM_IMAGES_ON_SAVE_KEY}_{self.field.name}',
+                True
+            )
+        else:
+            self.build_versatileimagefield_url_set()
+
+    @property
+    def is_warmed_in_background(self):
+        return bool(self.field.images_warmer) or (
+            IMAGE_ASYNC_RENDITIONS and self.create_on_demand
+        )
+
+    def warm_in_background(self):
         images_warmer = self.field.images_warmer
 
         if images_warmer:
             transaction.on_commit(lambda: images_warmer(self.instance))
         else:
-            self.build_versatileimagefield_url_set()
+            transaction.on_commit(lambda: enqueue_warm_images(self))
 
     def build_versatileimagefield_url_set(self):
         file = VersatileImageFieldFile(self.instance, self.field, self.name)
 
         if self.name and self.storage.exists(self.name):
-            self._sizes = (
-                self.image_sizes_serializer(
-                    sizes=self.image_sizes
-                )
-                .to_representation(
-                    file
+            with metric_tags(key_set=self.image_sizes.name):
+                if file.create_on_demand:
+                    # create all renditions at once,
+                    # decoding the original once
+                    create_renditions(file, self.image_sizes.compiled_keys)
+
+                self._sizes = (
+                    self.image_sizes
+                    .get_serializer(self.image_sizes_serializer)
+                    .to_representation(
+                        file
+                    )
                 )
-            )
         else:
             self._sizes = {
                 key: self.field.placeholder_image_name
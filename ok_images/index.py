@@ -0,0 +1,92 @@
+from functools import lru_cache
+
+from django.utils.module_loading import import_string
+
+from versatileimagefield.settings import cache
+
+from .consts import IMAGE_RENDITION_INDEX
+from .metrics import timer
+
+__all__ = (
+    'BaseRenditionIndex',
+    'StorageRenditionIndex',
+    'get_rendition_index',
+)
+
+
+class BaseRenditionIndex:
+    """
+    Source of truth of created renditions, which is asked instead of
+    storage, whether a rendition exists.
+
+    Renditions are added to an index on creation and removed on deletion.
+    A rendition, which is missing in an index, is checked on storage
+    before creation with `discover` (e.g. it was created before an index).
+
+    An index also marks optimized images, so they're skipped by
+    `optimize_existing_images`. Default markers are kept in cache.
+    """
+
+    def exists(self, storage, name):
+        raise NotImplementedError(
+            'Subclasses MUST provide an `exists` method.'
+        )
+
+    def filter_existing(self, storage, names):
+        """Return a set of existing renditions of `names`."""
+        return {
+            name
+            for name in names
+            if self.exists(storage, name)
+        }
+
+    def discover(self, storage, name, source_name):
+        """Check a rendition on storage and add it, if it exists."""
+        with timer('storage.exists'):
+            exists = storage.exists(name)
+
+        if exists:
+            self.add(storage, name, source_name)
+            return True
+
+        return False
+
+    def add(self, storage, name, source_name):
+        pass
+
+    def remove(self, storage, names):
+        pass
+
+    def get_optimized_key(self, name):
+        return f'ok_images:optimized:{name}'
+
+    def filter_optimized(self, storage, names):
+        """Return a set of optimized images of `names`."""
+        keys = {self.get_optimized_key(name): name for name in names}
+        return {keys[key] for key in cache.get_many(list(keys))}
+
+    def add_optimized(self, storage, name):
+        cache.set(self.get_optimized_key(name), 1, None)
+
+    def remove_optimized(self, storage, names):
+        cache.delete_many([self.get_optimized_key(name) for name in names])
+
+    def get_renditions(self, storage, source_name):
+        """
+        Return names of all renditions of `source_name`
+        or `None`, if they're unknown and storage should be listed.
+        """
+        return None
+
+
+class StorageRenditionIndex(BaseRenditionIndex):
+    """Default index without state, which asks storage each time."""
+
+    def exists(self, storage, name):
+        with timer('storage.exists'):
+            return storage.exists(name)
+
+
+@lru_cache(maxsize=None)
+def get_rendition_index():
+    return import_string(IMAGE_RENDITION_INDEX)()
@@ -0,0 +1,158 @@
+"""
+Rendition key sets, parsed and validated once.
+
+Named key sets of `VERSATILEIMAGEFIELD_RENDITION_KEY_SETS` are compiled
+on app ready (see `ok_images.apps`), so files, fields and serializers
+only look them up.
+"""
+from collections import namedtuple
+from functools import lru_cache
+
+from django.core.exceptions import ImproperlyConfigured
+
+from versatileimagefield.utils import (
+    InvalidSizeKey,
+    validate_versatileimagefield_sizekey_list
+)
+
+from .consts import IMAGE_DEFAULT_RENDITION_KEY_SET, IMAGE_RENDITION_KEY_SETS
+
+__all__ = (
+    'SizeKey',
+    'compile_size_key',
+    'KeySet',
+    'compile_key_sets',
+    'get_key_set',
+)
+
+SizeKey = namedtuple(
+    'SizeKey',
+    (
+        'name',
+        'size_key',
+        # attributes of an image file, which give a sizer or a filter,
+        # e.g. ('filters', 'to_webp', 'crop'), empty for the original
+        'attrs',
+        # e.g. '460x430' or `None` for filters and the original
+        'size',
+        'width',
+        'height',
+    )
+)
+SizeKey.__doc__ = """
+Parsed size key. Sizers and filters are looked up by `attrs` on use,
+so ones, which are registered later, are found.
+"""
+
+_key_sets = {}
+
+
+@lru_cache(maxsize=1024)
+def compile_size_key(size_key, name=None):
+    """Parse a size key, e.g. 'crop__400x400' or 'filters__to_webp__url'."""
+    attrs = size_key.split('__')
+    size = width = height = None
+
+    if 'x' in attrs[-1]:
+        size = attrs.pop(-1)
+
+        try:
+            width, height = [int(i) for i in size.split('x')]
+        except ValueError:
+            raise InvalidSizeKey(f'{size_key} has an invalid size {size}')
+
+    if attrs[-1] == 'url':
+        attrs.pop(-1)
+
+    return SizeKey(name, size_key, tuple(attrs), size, width, height)
+
+
+class KeySet:
+    """
+    Immutable validated rendition key set. Iterates over
+    (name, size key) pairs like a validated list of `versatileimagefield`.
+    """
+
+    def __init__(self, sizes, name=None):
+        validate_versatileimagefield_sizekey_list(sizes)
+        self.name = name
+        # duplicates are dropped, keeping an order
+        self.items = tuple(dict.fromkeys(tuple(item) for item in sizes))
+        self.size_keys = tuple(size_key for _, size_key in self.items)
+        self.compiled_keys = tuple(
+            compile_size_key(size_key, key)
+            for key, size_key in self.items
+        )
+        self._serializers = {}
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __len__(self):
+        return len(self.items)
+
+    def __reduce__(self):
+        # pickled files get a compiled key set back, without serializers
+        return get_key_set, (self.name or self.items,)
+
+    def __repr__(self):
+        return f'<KeySet {self.name or list(self.items)}>'
+
+    def get_serializer(self, serializer_class):
+        """Return a shared serializer of the key set."""
+        serializer = self._serializers.get(serializer_class)
+
+        if serializer is None:
+            serializer = serializer_class(sizes=list(self.items))
+            self._serializers[serializer_class] = serializer
+
+        return serializer
+
+
+def compile_key_sets():
+    """Compile named key sets (on app ready)."""
+    _key_sets.clear()
+
+    for name, sizes in IMAGE_RENDITION_KEY_SETS.items():
+        _key_sets[name] = KeySet(sizes, name=name)
+
+    get_compiled_key_set.cache_clear()
+
+
+@lru_cache(maxsize=256)
+def get_compiled_key_set(sizes):
+    return KeySet(sizes)
+
+
+def get_key_set(image_sizes=None):
+    """
+    Return a compiled key set of a name, a list of (name, size key) pairs,
+    or the default key set.
+    """
+    if isinstance(image_sizes, KeySet):
+        return image_sizes
+
+    if not image_sizes:
+        image_sizes = IMAGE_DEFAULT_RENDITION_KEY_SET
+
+    if not isinstance(image_sizes, str):
+        return get_compiled_key_set(
+            tuple(tuple(item) for item in image_sizes)
+        )
+
+    key_set = _key_sets.get(image_sizes)
+
+    if key_set is None:
+        # the app isn't ready yet or isn't installed
+        try:
+            sizes = IMAGE_RENDITION_KEY_SETS[image_sizes]
+        except KeyError:
+            raise ImproperlyConfigured(
+                "No Rendition Key Set exists at "
+                "settings.VERSATILEIMAGEFIELD_RENDITION_KEY_SETS"
+                f"['{image_sizes}']"
+            )
+
+        key_set = _key_sets[image_sizes] = KeySet(sizes, name=image_sizes)
+
+    return key_set
@@ -0,0 +1,45 @@
+import time
+
+from versatileimagefield.settings import cache
+
+from .consts import IMAGE_RENDITION_LOCK_TIMEOUT, IMAGE_RENDITION_LOCK_WAIT
+
+__all__ = (
+    'RenditionLock',
+)
+
+
+class RenditionLock:
+    """
+    Single-flight lock of a rendition, so only one of concurrent workers
+    creates it and others wait for it or fall back to a source image.
+
+    The lock is kept in cache, so it works across processes and servers
+    only with a shared cache (e.g. memcached or redis).
+    """
+
+    def __init__(self, name, timeout=IMAGE_RENDITION_LOCK_TIMEOUT):
+        self.key = f'ok_images:lock:{name}'
+        # a lock of a crashed worker expires after this time
+        self.timeout = timeout
+
+    def acquire(self):
+        return cache.add(self.key, 1, self.timeout)
+
+    def release(self):
+        cache.delete(self.key)
+
+    def locked(self):
+        return cache.get(self.key) is not None
+
+    def wait(self, timeout=IMAGE_RENDITION_LOCK_WAIT, interval=0.1):
+        """Wait until a lock is released. Return `False` on timeout."""
+        deadline = time.monotonic() + timeout
+
+        while self.locked():
+            if time.monotonic() >= deadline:
+                return False
+
+            time.sleep(interval)
+
+        return True
@@ -0,0 +1,156 @@
+import json
+import os
+import time
+
+from django.apps import apps
+from django.core.management.base import BaseCommand, CommandError
+
+from ..utils import get_model_image_fields, get_queryset_batches
+
+__all__ = (
+    'Checkpoint',
+    'ImagesCommand',
+    'BatchImagesCommand',
+)
+
+
+class Checkpoint:
+    """
+    Last processed primary keys of models, persisted to a json file
+    after each batch, so a killed job could be resumed.
+    """
+
+    def __init__(self, path=None):
+        self.path = path
+        self.state = {}
+
+        if path and os.path.exists(path):
+            with open(path) as f:
+                self.state = json.load(f)
+
+    def get(self, label):
+        return self.state.get(label)
+
+    def set(self, label, pk):
+        self.state[label] = pk
+
+        if not self.path:
+            return
+
+        # write to a temporary file first to never leave a broken checkpoint
+        temp_path = f'{self.path}.tmp'
+
+        with open(temp_path, 'w') as f:
+            json.dump(self.state, f, default=str)
+
+        os.replace(temp_path, self.path)
+
+    def clear(self):
+        self.state = {}
+
+        if self.path and os.path.exists(self.path):
+            os.remove(self.path)
+
+
+class ImagesCommand(BaseCommand):
+    """
+    Base command to process models with image fields.
+    Processes all models with `OptimizedImageField` if none are passed.
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'models',
+            nargs='*',
+            metavar='app_label.ModelName',
+            help='Models to process. Defaults to all models with image fields.'
+        )
+
+    def get_models(self, labels):
+        if not labels:
+            return [
+                model
+                for model in apps.get_models()
+                if get_model_image_fields(model)
+            ]
+
+        models = []
+
+        for label in labels:
+            try:
+                models.append(apps.get_model(label))
+            except (LookupError, ValueError) as e:
+                raise CommandError(e)
+
+        return models
+
+
+class BatchImagesCommand(ImagesCommand):
+    """
+    Base command to process models in batches of primary key ranges
+    with progress output and optional checkpoint to resume from.
+
+    Subclasses must implement `process_batch` method.
+    """
+
+    def add_arguments(self, parser):
+        super().add_arguments(parser)
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='Number of instances to load at once.'
+        )
+        parser.add_argument(
+            '--checkpoint',
+            help=(
+                'Path to a file to store the last processed primary key. '
+                'A killed job resumes from it, the file is removed '
+                'when the job is done.'
+            )
+        )
+
+    def handle(self, *args, **options):
+        checkpoint = Checkpoint(options['checkpoint'])
+
+        for model in self.get_models(options['models']):
+            self.process_model(model, checkpoint, options)
+
+        checkpoint.clear()
+
+    def process_model(self, model, checkpoint, options):
+        label = model._meta.label
+        queryset = model._default_manager.all()
+        last_pk = checkpoint.get(label)
+
+        if last_pk is not None:
+            queryset = queryset.filter(pk__gt=last_pk)
+            self.stdout.write(f'{label}: resuming after pk {last_pk}')
+
+        total = queryset.count()
+        processed = 0
+        started_at = time.monotonic()
+
+        for batch, size, last_pk in get_queryset_batches(
+                queryset,
+                options['batch_size']
+        ):
+            self.process_batch(batch, options)
+            checkpoint.set(label, last_pk)
+            processed += size
+            elapsed = time.monotonic() - started_at
+            self.stdout.write(
+                f'{label}: {processed}/{total} '
+                f'({processed / elapsed if elapsed else 0:.1f} instances/s), '
+                f'last pk {last_pk}'
+            )
+
+        self.stdout.write(self.style.SUCCESS(
+            f'{label}: {processed} instances processed '
+            f'in {time.monotonic() - started_at:.1f}s'
+        ))
+
+    def process_batch(self, queryset, options):
+        raise NotImplementedError(
+            'Subclasses MUST provide a `process_batch` method.'
+        )
@@ -0,0 +1,29 @@
+from ...utils import delete_all_created_images
+from ..base import BatchImagesCommand
+
+
+class Command(BatchImagesCommand):
+    help = 'Deletes all created images and clears cache.'
+
+    def add_arguments(self, parser):
+        super().add_arguments(parser)
+        parser.add_argument(
+            '--keep-images',
+            action='store_true',
+            help='Only clear cache, keeping created images on storage.'
+        )
+        parser.add_argument(
+            '--listdir',
+            action='store_true',
+            help=(
+                'List storage folders to delete images of any sizes, '
+                'not only of rendition key sets.'
+            )
+        )
+
+    def process_batch(self, queryset, options):
+        delete_all_created_images(
+            queryset,
+            delete_images=not options['keep_images'],
+            listdir=options['listdir']
+        )
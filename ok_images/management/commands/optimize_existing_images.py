@@ -0,0 +1,54 @@
+from ...consts import IMAGE_OPTIMIZE_MIN_GAIN
+from ...utils import OptimizationStats, optimize_existing_images
+from ..base import BatchImagesCommand
+
+
+class Command(BatchImagesCommand):
+    help = (
+        'Optimizes existing images in place. Images, which were optimized '
+        'before, are skipped.'
+    )
+
+    def add_arguments(self, parser):
+        super().add_arguments(parser)
+        parser.add_argument(
+            '--min-gain',
+            type=float,
+            default=IMAGE_OPTIMIZE_MIN_GAIN,
+            help=(
+                'Replace an image only if an optimized one is smaller '
+                'at least by this part of the original size.'
+            )
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=1,
+            help='Number of threads, which optimize images of a batch.'
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Report bytes, which would be saved, without replacing images.'
+        )
+        parser.add_argument(
+            '--force',
+            action='store_true',
+            help='Optimize images, which were optimized before, too.'
+        )
+
+    def handle(self, *args, **options):
+        self.stats = OptimizationStats()
+        super().handle(*args, **options)
+        self.stdout.write(self.style.SUCCESS(f'Total: {self.stats}'))
+
+    def process_batch(self, queryset, options):
+        stats = optimize_existing_images(
+            queryset,
+            min_gain=options['min_gain'],
+            dry_run=options['dry_run'],
+            force=options['force'],
+            workers=options['workers']
+        )
+        self.stats.merge(stats)
+        self.stdout.write(str(stats))
@@ -0,0 +1,61 @@
+from ...utils import get_warm_images_executor, warm_images
+from ..base import BatchImagesCommand
+
+
+class Command(BatchImagesCommand):
+    help = 'Creates all renditions of image fields.'
+
+    def add_arguments(self, parser):
+        super().add_arguments(parser)
+        parser.add_argument(
+            '--rendition-key-set',
+            help=(
+                'Rendition key set name. Defaults to `image_sizes` '
+                'of a field or a model.'
+            )
+        )
+        parser.add_argument(
+            '--image-attr',
+            help='Image field name. Defaults to all image fields of a model.'
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=None,
+            help='Number of worker processes.'
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=100,
+            help='Number of instances, passed to a worker process at once.'
+        )
+
+    def handle(self, *args, **options):
+        self.warmed = 0
+        self.executor = None
+
+        if options['workers']:
+            self.executor = get_warm_images_executor(options['workers'])
+
+        try:
+            super().handle(*args, **options)
+        finally:
+            if self.executor is not None:
+                self.executor.shutdown()
+
+        self.stdout.write(f'{self.warmed} images warmed')
+
+    def process_batch(self, queryset, options):
+        num_images_pre_warmed, failed = warm_images(
+            queryset,
+            rendition_key_set=options['rendition_key_set'],
+            image_attr=options['image_attr'],
+            workers=options['workers'],
+            chunk_size=options['chunk_size'],
+            executor=self.executor
+        )
+        self.warmed += num_images_pre_warmed
+
+        for path in failed:
+            self.stderr.write(f'Failed to warm {path}')
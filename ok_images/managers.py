@@ -0,0 +1,52 @@
+from django.db import models
+from django.db.models.query import ModelIterable
+
+from .utils import prefetch_renditions
+
+__all__ = (
+    'ImageQuerySet',
+    'ImageManager',
+)
+
+
+class ImageQuerySet(models.QuerySet):
+    """
+    QuerySet to resolve image variations of all fetched instances
+    at once (see `ok_images.utils.prefetch_renditions`).
+
+    Product.objects.prefetch_renditions()
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._prefetch_renditions = None
+        self._prefetch_renditions_done = False
+
+    def prefetch_renditions(self, image_attr: str = None):
+        clone = self._clone()
+        # use empty string as "all image fields" lookup
+        clone._prefetch_renditions = image_attr or ''
+        return clone
+
+    def _clone(self, *args, **kwargs):
+        clone = super()._clone(*args, **kwargs)
+        clone._prefetch_renditions = self._prefetch_renditions
+        return clone
+
+    def _fetch_all(self):
+        super()._fetch_all()
+
+        if (
+                self._prefetch_renditions is not None
+                and not self._prefetch_renditions_done
+                and issubclass(self._iterable_class, ModelIterable)
+        ):
+            prefetch_renditions(
+                self._result_cache,
+                image_attr=self._prefetch_renditions or None
+            )
+            self._prefetch_renditions_done = True
+
+
+class ImageManager(models.Manager.from_queryset(ImageQuerySet)):
+    pass
@@ -0,0 +1,239 @@
+"""
+Timings and counters of rendition generation and optimization.
+
+Metrics are sent to a collector, set with `IMAGE_METRICS` setting.
+The default one does nothing, `StatsDMetrics` and `PrometheusMetrics`
+send them to StatsD or expose them to Prometheus.
+
+Sent metrics:
+
+* `rendition.retrieve`, `rendition.process`, `rendition.save`,
+  `rendition.create` - timings of reading and decoding a source, resizing
+  and encoding, saving and a whole creation of a rendition;
+* `rendition.cache` - a counter of cache lookups of renditions
+  with `result` tag (`hit` or `miss`);
+* `storage.exists` - timings of checks of renditions on storage;
+* `optimizer` - timings of `image_optimizer`;
+* `optimizer.saved_bytes` - a counter of bytes, saved by `image_optimizer`.
+
+Metrics are tagged with `sizer` (e.g. `crop`, `to_webp`), `format`
+and `key_set`, if they're known.
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import lru_cache
+import socket
+import threading
+import time
+
+from django.core.exceptions import ImproperlyConfigured
+from django.utils.module_loading import import_string
+
+from .consts import IMAGE_METRICS, IMAGE_METRICS_OPTIONS
+
+__all__ = (
+    'BaseMetrics',
+    'NullMetrics',
+    'StatsDMetrics',
+    'PrometheusMetrics',
+    'get_metrics',
+    'metric_tags',
+    'increment',
+    'timing',
+    'timer',
+)
+
+# tags of metrics, sent within `metric_tags` block (e.g. a key set);
+# `contextvars` require Python 3.7, see `python_requires` of setup.cfg
+_context_tags = ContextVar('ok_images_metric_tags', default={})
+
+
+class BaseMetrics:
+    """Collector of counters and timings (in seconds) with tags."""
+    enabled = True
+
+    def increment(self, name, value=1, tags=None):
+        raise NotImplementedError(
+            'Subclasses MUST provide an `increment` method.'
+        )
+
+    def timing(self, name, seconds, tags=None):
+        raise NotImplementedError(
+            'Subclasses MUST provide a `timing` method.'
+        )
+
+
+class NullMetrics(BaseMetrics):
+    """Default collector, which drops metrics."""
+    enabled = False
+
+    def increment(self, name, value=1, tags=None):
+        pass
+
+    def timing(self, name, seconds, tags=None):
+        pass
+
+
+class StatsDMetrics(BaseMetrics):
+    """
+    Sends metrics to StatsD over UDP. Tags are sent in DogStatsD format
+    (`|#key:value`), which is supported by Datadog, Telegraf and
+    statsd_exporter, with `tags=False` their values are appended
+    to a metric name.
+    """
+
+    def __init__(self, host='localhost', port=8125, prefix='ok_images',
+                 tags=True):
+        self.address = (host, port)
+        self.prefix = prefix
+        self.tags = tags
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+
+    def send(self, name, value, metric_type, tags):
+        name = f'{self.prefix}.{name}' if self.prefix else name
+        suffix = ''
+
+        if tags and self.tags:
+            suffix = '|#' + ','.join(
+                f'{key}:{tag}' for key, tag in sorted(tags.items())
+            )
+        elif tags:
+            name = '.'.join([name, *(tags[key] for key in sorted(tags))])
+
+        try:
+            self.socket.sendto(
+                f'{name}:{value}|{metric_type}{suffix}'.encode(),
+                self.address
+            )
+        except OSError:
+            # metrics never break rendering
+            pass
+
+    def increment(self, name, value=1, tags=None):
+        self.send(name, value, 'c', tags)
+
+    def timing(self, name, seconds, tags=None):
+        self.send(name, round(seconds * 1000, 3), 'ms', tags)
+
+
+class PrometheusMetrics(BaseMetrics):
+    """
+    Exposes metrics with `prometheus_client`: counters as
+    `ok_images_<name>_total` and timings as `ok_images_<name>_seconds`
+    histograms, e.g. p99 of creation of renditions per key set:
+
+        histogram_quantile(0.99, sum by (le, key_set)
+            (rate(ok_images_rendition_create_seconds_bucket[5m])))
+    """
+    labels = ('key_set', 'sizer', 'format', 'result')
+
+    def __init__(self, namespace='ok_images', registry=None, buckets=None):
+        try:
+            import prometheus_client
+        except ImportError:
+            raise ImproperlyConfigured(
+                'prometheus_client is required for PrometheusMetrics'
+            )
+
+        self.prometheus_client = prometheus_client
+        self.namespace = namespace
+        self.registry = registry or prometheus_client.REGISTRY
+        self.buckets = buckets
+        self.metrics = {}
+        self.lock = threading.Lock()
+
+    def get_metric(self, metric_class, name, **kwargs):
+        metric = self.metrics.get(name)
+
+        if metric is None:
+            with self.lock:
+                metric = self.metrics.get(name)
+
+                if metric is None:
+                    metric = self.metrics[name] = metric_class(
+                        name,
+                        f'ok_images {name}',
+                        labelnames=self.labels,
+                        namespace=self.namespace,
+                        registry=self.registry,
+                        **kwargs
+                    )
+
+        return metric
+
+    def get_labels(self, tags):
+        tags = tags or {}
+        return [str(tags.get(label, '')) for label in self.labels]
+
+    def increment(self, name, value=1, tags=None):
+        metric = self.get_metric(
+            self.prometheus_client.Counter, name.replace('.', '_')
+        )
+        metric.labels(*self.get_labels(tags)).inc(value)
+
+    def timing(self, name, seconds, tags=None):
+        kwargs = {'buckets': self.buckets} if self.buckets else {}
+        metric = self.get_metric(
+            self.prometheus_client.Histogram,
+            f"{name.replace('.', '_')}_seconds",
+            **kwargs
+        )
+        metric.labels(*self.get_labels(tags)).observe(seconds)
+
+
+@lru_cache(maxsize=None)
+def get_metrics():
+    return import_string(IMAGE_METRICS)(**IMAGE_METRICS_OPTIONS)
+
+
+@contextmanager
+def metric_tags(**tags):
+    """Tag metrics, sent within a block, e.g. with a key set."""
+    token = _context_tags.set({
+        **_context_tags.get(),
+        **{key: value for key, value in tags.items() if value is not None}
+    })
+
+    try:
+        yield
+    finally:
+        _context_tags.reset(token)
+
+
+def get_tags(tags):
+    context_tags = _context_tags.get()
+    tags = {key: value for key, value in tags.items() if value is not None}
+    return {**context_tags, **tags} if context_tags else tags
+
+
+def increment(name, value=1, **tags):
+    metrics = get_metrics()
+
+    if metrics.enabled:
+        metrics.increment(name, value, get_tags(tags))
+
+
+def timing(name, seconds, **tags):
+    metrics = get_metrics()
+
+    if metrics.enabled:
+        metrics.timing(name, seconds, get_tags(tags))
+
+
+@contextmanager
+def timer(name, **tags):
+    """Send a timing of a block."""
+    metrics = get_metrics()
+
+    if not metrics.enabled:
+        yield
+        return
+
+    started_at = time.perf_counter()
+
+    try:
+        yield
+    finally:
+        metrics.timing(
+            name, time.perf_counter() - started_at, get_tags(tags)
+        )
@@ -0,0 +1,72 @@
+from collections import namedtuple
+from io import BytesIO
+import magic
+
+from PIL import Image
+
+__all__ = (
+    'ImageProbe',
+    'probe_image',
+)
+
+# bytes of a header, which are enough to get dimensions of most images
+PROBE_SIZE = 16 * 1024
+
+PROBE_KEY = '_image_probe'
+
+ImageProbe = namedtuple(
+    'ImageProbe',
+    (
+        'width',
+        'height',
+        'format',
+        'mime_type',
+        # Pillow refused to open an image with too many pixels,
+        # its dimensions are unknown
+        'decompression_bomb',
+    )
+)
+# `defaults` of namedtuple require Python 3.7
+ImageProbe.__new__.__defaults__ = (False,)
+
+
+def probe_image(value):
+    """
+    Get dimensions, format and MIME type of an image from its header
+    without decoding it or copying a whole file.
+
+    A probe is memoized on a file, so validators of a field read
+    an upload once. Dimensions and format of a file, which isn't
+    an image, are `None`. An image, which Pillow refuses to open
+    as a decompression bomb, is marked with `decompression_bomb`.
+    """
+    probe = value.__dict__.get(PROBE_KEY)
+
+    if probe is not None:
+        return probe
+
+    value.seek(0)
+    header = value.read(PROBE_SIZE)
+    mime_type = magic.from_buffer(header, mime=True)
+
+    try:
+        try:
+            image = Image.open(BytesIO(header))
+        except OSError:
+            # a header is bigger, e.g. with a large EXIF block,
+            # Pillow reads a file up to dimensions only
+            value.seek(0)
+            image = Image.open(value)
+
+        width, height = image.size
+        probe = ImageProbe(width, height, image.format, mime_type)
+    except Image.DecompressionBombError:
+        probe = ImageProbe(None, None, None, mime_type, True)
+    except OSError:
+        # not an image, but a MIME type could be validated
+        probe = ImageProbe(None, None, None, mime_type)
+    finally:
+        value.seek(0)
+
+    value.__dict__[PROBE_KEY] = probe
+    return probe
@@ -0,0 +1,192 @@
+"""
+Adaptive quality of JPEG and lossy WebP images.
+
+Quality is binary searched between `min_quality` and `max_quality`
+for the lowest one, which keeps an image similar to an original
+(SSIM of downsampled grayscale copies), and for the highest one, which
+fits into a byte budget. A number of encodings of each search is capped
+with `max_iterations`, so savings don't cost unbounded CPU time.
+"""
+from functools import lru_cache
+from io import BytesIO, SEEK_END
+
+from django.core.exceptions import ImproperlyConfigured
+from PIL import Image
+
+from .consts import IMAGE_ADAPTIVE_QUALITY
+from .keysets import get_key_set
+
+__all__ = (
+    'AdaptiveQuality',
+    'get_ssim',
+    'get_adaptive_quality',
+)
+
+ADAPTIVE_FORMATS = ('JPEG', 'WEBP')
+
+# images are compared at this size in blocks of this size
+SSIM_SIZE = 256
+SSIM_BLOCK = 8
+SSIM_C1 = (0.01 * 255) ** 2
+SSIM_C2 = (0.03 * 255) ** 2
+
+
+def get_ssim_array(image):
+    try:
+        import numpy
+    except ImportError:
+        raise ImproperlyConfigured('numpy is required to compute SSIM')
+
+    image = image.convert('L')
+    image.thumbnail((SSIM_SIZE, SSIM_SIZE))
+    return numpy.asarray(image, dtype=numpy.float64)
+
+
+def get_ssim(reference, other):
+    """
+    Return a mean SSIM of blocks of two grayscale arrays
+    (see `get_ssim_array`), `1` for identical images.
+    """
+    size = min(SSIM_BLOCK, *reference.shape)
+    height, width = (side - side % size for side in reference.shape)
+
+    def get_blocks(array):
+        return (
+            array[:height, :width]
+            .reshape(height // size, size, width // size, size)
+            .swapaxes(1, 2)
+            .reshape(height // size, width // size, size * size)
+        )
+
+    x, y = get_blocks(reference), get_blocks(other)
+    mean_x, mean_y = x.mean(axis=-1), y.mean(axis=-1)
+    covariance = (
+        (x - mean_x[..., None]) * (y - mean_y[..., None])
+    ).mean(axis=-1)
+    ssim = (
+        (2 * mean_x * mean_y + SSIM_C1) * (2 * covariance + SSIM_C2)
+        / (
+            (mean_x ** 2 + mean_y ** 2 + SSIM_C1)
+            * (x.var(axis=-1) + y.var(axis=-1) + SSIM_C2)
+        )
+    )
+    return float(ssim.mean())
+
+
+class AdaptiveQuality:
+    """
+    Encodes an image with the lowest quality, which keeps SSIM
+    of at least `min_ssim`, and with the highest quality, which fits
+    into `max_bytes`. If both are set, a budget wins.
+    """
+
+    def __init__(self, max_bytes=None, min_ssim=None, min_quality=40,
+                 max_quality=95, max_iterations=6):
+        if not (max_bytes or min_ssim):
+            raise ImproperlyConfigured(
+                'Adaptive quality requires `max_bytes` or `min_ssim`'
+            )
+
+        self.max_bytes = max_bytes
+        self.min_ssim = min_ssim
+        self.min_quality = min_quality
+        self.max_quality = max_quality
+        self.max_iterations = max_iterations
+
+    def is_supported(self, save_kwargs):
+        return (
+            save_kwargs.get('format') in ADAPTIVE_FORMATS
+            and not save_kwargs.get('lossless')
+        )
+
+    def save(self, image, save_kwargs, quality):
+        imagefile = BytesIO()
+        image.save(imagefile, **{**save_kwargs, 'quality': quality})
+        return imagefile
+
+    def get_ssim(self, reference, imagefile):
+        imagefile.seek(0)
+        ssim = get_ssim(reference, get_ssim_array(Image.open(imagefile)))
+        # a position is a size of an encoded image
+        imagefile.seek(0, SEEK_END)
+        return ssim
+
+    def encode(self, image, save_kwargs):
+        """Return a BytesIO of an image, encoded with adaptive quality."""
+        def search(low, high, is_acceptable, lowest):
+            """
+            Binary search the lowest (or the highest) acceptable quality
+            with up to `max_iterations` encodings.
+            Return it with an encoded image or `(None, None)`.
+            """
+            found = (None, None)
+
+            for _ in range(self.max_iterations):
+                if low > high:
+                    break
+
+                quality = (low + high) // 2
+                imagefile = self.save(image, save_kwargs, quality)
+
+                if is_acceptable(imagefile):
+                    found = (quality, imagefile)
+
+                    if lowest:
+                        high = quality - 1
+                    else:
+                        low = quality + 1
+                elif lowest:
+                    low = quality + 1
+                else:
+                    high = quality - 1
+
+            return found
+
+        quality, imagefile = self.max_quality, None
+
+        if self.min_ssim:
+            reference = get_ssim_array(image)
+            quality, imagefile = search(
+                self.min_quality,
+                self.max_quality,
+                lambda imagefile: (
+                    self.get_ssim(reference, imagefile) >= self.min_ssim
+                ),
+                lowest=True
+            )
+
+            if quality is None:
+                quality, imagefile = self.max_quality, None
+
+        if self.max_bytes and (
+            imagefile is None or imagefile.tell() > self.max_bytes
+        ):
+            quality, imagefile = search(
+                self.min_quality,
+                quality if imagefile is None else quality - 1,
+                lambda imagefile: imagefile.tell() <= self.max_bytes,
+                lowest=False
+            )
+
+            if quality is None:
+                # the budget can't be met, the smallest image is kept
+                quality, imagefile = self.min_quality, None
+
+        if imagefile is None:
+            imagefile = self.save(image, save_kwargs, quality)
+
+        return imagefile
+
+
+@lru_cache(maxsize=None)
+def get_adaptive_quality(size_key):
+    """
+    Return adaptive quality of renditions of `size_key` from options
+    of a first key set in `IMAGE_ADAPTIVE_QUALITY`, which has it,
+    or `None`.
+    """
+    for name, options in IMAGE_ADAPTIVE_QUALITY.items():
+        if size_key in get_key_set(name).size_keys:
+            return AdaptiveQuality(**options)
+
+    return None
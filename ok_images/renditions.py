@@ -0,0 +1,325 @@
+from collections import namedtuple
+from functools import reduce
+
+from PIL import Image
+
+from versatileimagefield.datastructures.base import EXIF_ORIENTATION_KEY
+from versatileimagefield.files import VersatileImageFieldFile
+from versatileimagefield.settings import cache, VERSATILEIMAGEFIELD_CACHE_LENGTH
+from versatileimagefield.utils import get_image_metadata_from_file
+
+from .decoding import check_image_pixels, draft_image
+from .index import get_rendition_index
+from .keysets import compile_size_key, get_key_set
+from .locks import RenditionLock
+
+__all__ = (
+    'Rendition',
+    'SourceImage',
+    'get_size_keys',
+    'get_renditions_file',
+    'get_rendition_names',
+    'get_rendition',
+    'create_rendition',
+    'create_renditions',
+)
+
+EXIF_ORIENTATION_TRANSPOSE = {
+    3: Image.ROTATE_180,
+    6: Image.ROTATE_270,
+    8: Image.ROTATE_90,
+}
+
+
+Rendition = namedtuple(
+    'Rendition', ['name', 'url', 'image', 'size', 'size_key']
+)
+Rendition.__doc__ = """
+Resolved rendition of a size key.
+
+Attrs:
+    name (str): path of a rendition on storage
+    url (str): url of a rendition
+    image (ProcessedImage): sizer or filter to create a rendition,
+        `None` for the original image (`url` size key)
+    size (tuple): width and height for sizers, `None` for filters
+    size_key (SizeKey): compiled size key of a rendition
+"""
+
+
+class SourceImage:
+    """
+    An original image, retrieved from storage and decoded once
+    to create all of its renditions.
+    Sizers and filters get a copy of it through `source_image` attribute
+    (see `ok_images.contrib.versatileimagefield.versatileimagefield`).
+    """
+
+    def __init__(self, name, image, file_ext, image_format, mime_type):
+        self.name = name
+        self.image = image
+        self.file_ext = file_ext
+        self.image_format = image_format
+        self.mime_type = mime_type
+
+    @classmethod
+    def open(cls, storage, name, get_scale=None):
+        """
+        `get_scale`: A callable, which receives a size of an image
+                     and returns a minimal scale to decode it at.
+        """
+        file = storage.open(name, 'rb')
+
+        try:
+            image_format, mime_type = get_image_metadata_from_file(file)
+            image = Image.open(file)
+            check_image_pixels(image)
+
+            if get_scale is not None:
+                draft_image(image, get_scale(image.size))
+
+            image = cls.transpose(image)
+            image.load()
+        finally:
+            file.close()
+
+        return cls(
+            name=name,
+            image=image,
+            file_ext=name.rsplit('.')[-1],
+            image_format=image_format,
+            mime_type=mime_type
+        )
+
+    @staticmethod
+    def transpose(image):
+        """
+        Rotate an image according to its EXIF orientation once,
+        the same way as `ProcessedImage.preprocess` does for each rendition.
+        """
+        if not hasattr(image, '_getexif'):
+            return image
+
+        exif = image._getexif()
+
+        if exif is None:
+            return image
+
+        method = EXIF_ORIENTATION_TRANSPOSE.get(exif.get(EXIF_ORIENTATION_KEY))
+
+        if method is None:
+            return image
+
+        return image.transpose(method)
+
+    def copy(self):
+        return self.image.copy()
+
+
+def get_size_keys(rendition_key_set):
+    """Return a list of size keys for a rendition key set or its name."""
+    return list(get_key_set(rendition_key_set).size_keys)
+
+
+def get_renditions_file(image_file):
+    """
+    Return a copy of `image_file` with sizers and filters, which never
+    touch cache or storage and never create images on access.
+    """
+    file = VersatileImageFieldFile(
+        image_file.instance,
+        image_file.field,
+        image_file.name
+    )
+    # ppoi of a file could differ from ppoi of an instance
+    file._ppoi_value = image_file.ppoi
+    file.create_on_demand = False
+    return file
+
+
+def get_rendition_names(image_file, size_keys):
+    """
+    Return names of renditions of `size_keys` of an image
+    without touching cache or storage.
+    """
+    renditions_file = get_renditions_file(image_file)
+    names = {
+        get_rendition(renditions_file, size_key).name
+        for size_key in size_keys
+    }
+    names.discard(image_file.name)
+    return names
+
+
+def get_rendition(image_file, size_key):
+    """
+    Resolve `size_key` (e.g. 'crop__400x400', 'filters__to_webp__url'
+    or a compiled `SizeKey`) for a file, returned by `get_renditions_file`.
+    """
+    if isinstance(size_key, str):
+        size_key = compile_size_key(size_key)
+
+    if not size_key.attrs:
+        return Rendition(image_file.name, image_file.url, None, None, size_key)
+
+    image = reduce(getattr, size_key.attrs, image_file)
+
+    if size_key.size is None:
+        return Rendition(image.name, image.url, image, None, size_key)
+
+    size = (size_key.width, size_key.height)
+    get_path_and_url = getattr(image, 'get_resized_path_and_url', None)
+
+    if get_path_and_url is None:
+        sized_image = image[size_key.size]
+        return Rendition(
+            sized_image.name, sized_image.url, image, size, size_key
+        )
+
+    try:
+        name, url = get_path_and_url(*size)
+    except Exception:
+        # the same fallback as of `SizedImageMixin.__getitem__`
+        name, url = image.get_resized_path(*size), None
+
+    return Rendition(name, url, image, size, size_key)
+
+
+def create_rendition(rendition):
+    """Create an image of a resolved rendition on storage."""
+    if rendition.image is None:
+        return
+
+    # a sizer of a filter doesn't know the filter, so it takes a size key
+    # (e.g. for adaptive quality) from a rendition
+    rendition.image.size_key = rendition.size_key
+
+    try:
+        if rendition.size is None:
+            rendition.image.create_filtered_image(
+                path_to_image=rendition.image.path_to_image,
+                save_path_on_storage=rendition.name
+            )
+        else:
+            width, height = rendition.size
+            rendition.image.create_resized_image(
+                path_to_image=rendition.image.path_to_image,
+                save_path_on_storage=rendition.name,
+                width=width,
+                height=height
+            )
+    finally:
+        rendition.image.size_key = None
+
+
+def get_rendition_decode_scale(rendition, image_size):
+    get_scale = getattr(rendition.image, 'get_decode_scale', None)
+
+    # filters and unknown sizers need an image at full resolution
+    if rendition.size is None or get_scale is None:
+        return 1
+
+    return get_scale(image_size, *rendition.size)
+
+
+def create_missing_renditions(image_file, missing):
+    def get_scale(image_size):
+        return max(
+            get_rendition_decode_scale(rendition, image_size)
+            for rendition, lock in missing
+        )
+
+    source_image = SourceImage.open(
+        image_file.storage,
+        image_file.name,
+        get_scale=get_scale
+    )
+
+    for rendition, lock in missing:
+        rendition.image.source_image = source_image
+
+        try:
+            create_rendition(rendition)
+        finally:
+            rendition.image.source_image = None
+
+
+def create_renditions(image_file, size_keys):
+    """
+    Create all missing renditions of `image_file` for `size_keys`.
+
+    The original image is retrieved from storage and decoded only once
+    and then is shared by all sizers and filters, so a key set
+    with 6 renditions costs one download and one decode instead of six.
+    Returns a list of resolved renditions.
+    """
+    if not image_file:
+        return []
+
+    renditions_file = get_renditions_file(image_file)
+    renditions = {}
+
+    for size_key in size_keys:
+        rendition = get_rendition(renditions_file, size_key)
+
+        if rendition.image is not None:
+            renditions[rendition.name] = rendition
+
+    cached = cache.get_many([
+        rendition.url
+        for rendition in renditions.values()
+    ])
+    not_cached = [
+        rendition
+        for rendition in renditions.values()
+        if rendition.url not in cached
+    ]
+    index = get_rendition_index()
+    existing = index.filter_existing(
+        image_file.storage,
+        [rendition.name for rendition in not_cached]
+    )
+    # renditions, which are known to exist on storage
+    confirmed = [
+        rendition
+        for rendition in renditions.values()
+        if rendition.url in cached or rendition.name in existing
+    ]
+    missing = []
+
+    for rendition in not_cached:
+        if rendition.name in existing:
+            continue
+
+        lock = RenditionLock(rendition.name)
+
+        # skip renditions, which are created by other workers,
+        # they're cached by them
+        if not lock.acquire():
+            continue
+
+        # it could be created, while the lock was being acquired
+        if index.discover(image_file.storage, rendition.name, image_file.name):
+            lock.release()
+            confirmed.append(rendition)
+            continue
+
+        missing.append((rendition, lock))
+
+    try:
+        if missing:
+            create_missing_renditions(image_file, missing)
+    finally:
+        for rendition, lock in missing:
+            lock.release()
+
+    confirmed.extend(rendition for rendition, lock in missing)
+    cache.set_many(
+        {
+            rendition.url: 1
+            for rendition in confirmed
+        },
+        VERSATILEIMAGEFIELD_CACHE_LENGTH
+    )
+
+    return list(renditions.values())
@@ -0,0 +1,294 @@
+"""
+Background creation of renditions.
+
+Tasks receive only serializable arguments (import paths, deconstructed
+storages, primary keys), so queue backends could run them in other processes.
+"""
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+import logging
+import threading
+
+from django.apps import apps
+from django.db import connections
+from django.utils.module_loading import import_string
+
+from versatileimagefield.settings import cache, VERSATILEIMAGEFIELD_CACHE_LENGTH
+
+from .consts import IMAGE_RENDITIONS_BACKEND, IMAGE_RENDITIONS_BACKEND_OPTIONS
+from .index import get_rendition_index
+from .locks import RenditionLock
+from .workers import warm_images_chunk
+
+logger = logging.getLogger(__name__)
+
+__all__ = (
+    'BaseBackend',
+    'ThreadPoolBackend',
+    'CallableBackend',
+    'get_backend',
+    'run_task',
+    'enqueue',
+    'enqueue_sized_image',
+    'enqueue_filtered_image',
+    'enqueue_warm_images',
+    'enqueue_optimize_image',
+    'create_sized_image',
+    'create_filtered_image',
+    'optimize_image',
+)
+
+# enqueued task is not enqueued again until it's done or this time passes
+TASK_LOCK_TIMEOUT = 5 * 60
+
+
+class BaseBackend:
+    """
+    Runs tasks, which create renditions, in background.
+
+    Subclasses must implement `enqueue` method, which runs
+    `run_task(key, func, *args)` somewhere.
+    """
+
+    def enqueue(self, key, func, *args):
+        raise NotImplementedError(
+            'Subclasses MUST provide an `enqueue` method.'
+        )
+
+
+class ThreadPoolBackend(BaseBackend):
+    """
+    Runs tasks in an in-process thread pool.
+    A task with the same key is not enqueued while it's in flight.
+    """
+
+    def __init__(self, max_workers=2):
+        self.executor = ThreadPoolExecutor(
+            max_workers=max_workers,
+            thread_name_prefix='ok_images'
+        )
+        self.lock = threading.Lock()
+        self.keys = set()
+
+    def enqueue(self, key, func, *args):
+        with self.lock:
+            if key in self.keys:
+                return
+
+            self.keys.add(key)
+
+        self.executor.submit(self.run, key, func, *args)
+
+    def run(self, key, func, *args):
+        try:
+            run_task(key, func, *args)
+        except Exception:
+            logger.exception(f'Failed to create renditions of {key}')
+        finally:
+            # database connections are per thread
+            connections.close_all()
+
+            with self.lock:
+                self.keys.discard(key)
+
+
+class CallableBackend(BaseBackend):
+    """
+    Passes a task to a callable, e.g. one which sends it to Celery or RQ.
+    A worker must call `ok_images.tasks.run_task` with received arguments.
+
+    IMAGE_RENDITIONS_BACKEND_OPTIONS = {
+        'callable': 'myproject.tasks.enqueue_images_task'
+    }
+    """
+
+    def __init__(self, callable):
+        self.callable = import_string(callable)
+
+    def enqueue(self, key, func, *args):
+        self.callable(key, func, *args)
+
+
+@lru_cache(maxsize=None)
+def get_backend():
+    backend_class = import_string(IMAGE_RENDITIONS_BACKEND)
+    return backend_class(**IMAGE_RENDITIONS_BACKEND_OPTIONS)
+
+
+def get_import_path(obj):
+    return f'{obj.__module__}.{obj.__qualname__}'
+
+
+def deconstruct_storage(storage):
+    path, args, kwargs = storage.deconstruct()
+    return path, list(args), kwargs
+
+
+def get_storage(storage):
+    path, args, kwargs = storage
+    return import_string(path)(*args, **kwargs)
+
+
+def run_task(key, func, *args):
+    """Run a task, enqueued by `enqueue`, and let it be enqueued again."""
+    try:
+        import_string(func)(*args)
+    finally:
+        RenditionLock(key).release()
+
+
+def enqueue(key, func, *args):
+    """
+    Enqueue `func` to a configured backend, unless a task with the same key
+    is already enqueued or a rendition is created by any process.
+    """
+    lock = RenditionLock(key, timeout=TASK_LOCK_TIMEOUT)
+
+    if not lock.acquire():
+        return
+
+    try:
+        get_backend().enqueue(key, get_import_path(func), *args)
+    except Exception:
+        # a failed enqueue (e.g. a broker outage) must not break rendering,
+        # so an original image is served and a task is enqueued again later
+        lock.release()
+        logger.exception(f'Failed to enqueue a task of {key}')
+
+
+def enqueue_sized_image(sized_image, name, width, height):
+    enqueue(
+        name,
+        create_sized_image,
+        get_import_path(sized_image.__class__),
+        deconstruct_storage(sized_image.storage),
+        sized_image.path_to_image,
+        width,
+        height,
+        sized_image.ppoi
+    )
+
+
+def enqueue_filtered_image(filtered_image, filename_key):
+    enqueue(
+        filtered_image.name,
+        create_filtered_image,
+        get_import_path(filtered_image.__class__),
+        deconstruct_storage(filtered_image.storage),
+        filtered_image.path_to_image,
+        filename_key
+    )
+
+
+def enqueue_warm_images(image_file):
+    """Enqueue creation of all renditions of a saved image."""
+    instance = image_file.instance
+
+    if not image_file or instance.pk is None:
+        return
+
+    enqueue(
+        image_file.name,
+        warm_images_chunk,
+        instance._meta.label,
+        [instance.pk],
+        None,
+        image_file.field.name
+    )
+
+
+def enqueue_optimize_image(image_file):
+    """Enqueue deferred optimization of a saved image."""
+    instance = image_file.instance
+
+    if not image_file or instance.pk is None:
+        return
+
+    enqueue(
+        f'optimize:{image_file.name}',
+        optimize_image,
+        instance._meta.label,
+        instance.pk,
+        image_file.field.name,
+        image_file.name
+    )
+
+
+def create_sized_image(sizer, storage, path_to_image, width, height,
+                       ppoi=None):
+    storage = get_storage(storage)
+    sized_image = import_string(sizer)(
+        path_to_image=path_to_image,
+        storage=storage,
+        create_on_demand=False,
+        ppoi=ppoi
+    )
+    name = sized_image.get_resized_path(width, height)
+
+    if not get_rendition_index().discover(storage, name, path_to_image):
+        sized_image.create_resized_image(
+            path_to_image=path_to_image,
+            save_path_on_storage=name,
+            width=width,
+            height=height
+        )
+
+    cache.set(storage.url(name), 1, VERSATILEIMAGEFIELD_CACHE_LENGTH)
+
+
+def create_filtered_image(filter_, storage, path_to_image, filename_key):
+    storage = get_storage(storage)
+    filtered_image = import_string(filter_)(
+        path_to_image=path_to_image,
+        storage=storage,
+        create_on_demand=False,
+        filename_key=filename_key
+    )
+
+    if not get_rendition_index().discover(
+            storage, filtered_image.name, path_to_image
+    ):
+        filtered_image.create_filtered_image(
+            path_to_image=path_to_image,
+            save_path_on_storage=filtered_image.name
+        )
+
+    cache.set(filtered_image.url, 1, VERSATILEIMAGEFIELD_CACHE_LENGTH)
+
+
+def optimize_image(model_label, pk, field_name, name):
+    """
+    Optimize a stored image in place, delete renditions, which could be
+    created from the replaced original meanwhile, and warm images.
+    """
+    # contrib sizers import this module, while versatileimagefield
+    # is being imported, so utils can't be imported on module level
+    from .utils import optimize_stored_image
+
+    model = apps.get_model(model_label)
+    field = model._meta.get_field(field_name)
+    # the field is deferred to not create renditions of the original
+    # on initialization of an instance
+    instance = (
+        model._default_manager
+        .filter(pk=pk, **{field.attname: name})
+        .defer(field.attname)
+        .first()
+    )
+
+    # the instance is deleted or the image is replaced,
+    # since the task is enqueued
+    if instance is None:
+        return
+
+    image_file = field.attr_class(instance, field, name)
+    result = optimize_stored_image(image_file.storage, name)
+
+    # renditions, created from a replaced original, are created again
+    if result.replaced:
+        image_file.delete_all_created_images()
+
+    if image_file.is_warmed_in_background:
+        image_file.warm_in_background()
+    else:
+        image_file.build_versatileimagefield_url_set()
@@ -0,0 +1,221 @@
+"""
+TinyPNG API client for bulk compression.
+
+A client keeps a persistent HTTP session, limits a number of in-flight
+requests and a request rate, and retries throttled and failed requests
+with exponential backoff and jitter.
+"""
+from functools import lru_cache
+import logging
+import random
+import threading
+import time
+
+from django.core.exceptions import ImproperlyConfigured
+from django.utils.module_loading import import_string
+
+from .consts import (
+    TINYPNG_API_KEY,
+    TINYPNG_API_KEY_CACHE_TIMEOUT,
+    TINYPNG_API_KEY_FUNCTION,
+    TINYPNG_API_URL,
+    TINYPNG_CLIENT_OPTIONS
+)
+
+logger = logging.getLogger(__name__)
+
+__all__ = (
+    'TinyPNGError',
+    'TokenBucket',
+    'TinyPNGClient',
+    'get_tinypng_api_key',
+    'get_tinypng_client',
+)
+
+
+class TinyPNGError(Exception):
+    def __init__(self, message, status=None):
+        super().__init__(message)
+        self.status = status
+
+
+class TokenBucket:
+    """
+    Thread safe token bucket, which allows `rate` requests per second
+    on average and bursts of up to `capacity` requests.
+    """
+
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = capacity or max(rate, 1)
+        self.tokens = self.capacity
+        self.updated_at = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        """Block until a token is available and take it."""
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(
+                    self.capacity,
+                    self.tokens + (now - self.updated_at) * self.rate
+                )
+                self.updated_at = now
+
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+
+                delay = (1 - self.tokens) / self.rate
+
+            time.sleep(delay)
+
+
+class TinyPNGClient:
+    """
+    Compresses images with TinyPNG API.
+
+    Could be pointed to a local stub server with `base_url`.
+    """
+
+    # throttled and server errors are retried
+    retry_statuses = (429, 500, 502, 503, 504)
+
+    def __init__(self, api_key, base_url=TINYPNG_API_URL,
+                 max_concurrency=4, rate=None, max_retries=3,
+                 backoff=0.5, timeout=30):
+        try:
+            import requests
+            from requests.adapters import HTTPAdapter
+        except ImportError:
+            raise ImproperlyConfigured(
+                'requests is required for TinyPNGClient'
+            )
+
+        self.requests = requests
+        self.base_url = base_url
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self.semaphore = threading.BoundedSemaphore(max_concurrency)
+        self.bucket = TokenBucket(rate) if rate else None
+
+        self.session = requests.Session()
+        self.session.auth = ('api', api_key)
+        adapter = HTTPAdapter(pool_maxsize=max_concurrency)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    def close(self):
+        self.session.close()
+
+    def get_retry_delay(self, attempt, response=None):
+        retry_after = response is not None and response.headers.get(
+            'Retry-After'
+        )
+
+        if retry_after and retry_after.isdigit():
+            return int(retry_after)
+
+        # full jitter, so concurrent workers don't retry all at once
+        return random.uniform(0, self.backoff * 2 ** attempt)  # nosec
+
+    def request(self, method, url, **kwargs):
+        if not url.startswith(('http://', 'https://')):
+            url = f"{self.base_url.rstrip('/')}{url}"
+
+        kwargs.setdefault('timeout', self.timeout)
+
+        with self.semaphore:
+            for attempt in range(self.max_retries + 1):
+                is_last = attempt == self.max_retries
+
+                if self.bucket:
+                    self.bucket.acquire()
+
+                try:
+                    response = self.session.request(method, url, **kwargs)
+                except self.requests.RequestException as e:
+                    if is_last:
+                        raise TinyPNGError(f'Error while connecting: {e}')
+
+                    time.sleep(self.get_retry_delay(attempt))
+                    continue
+
+                if response.ok:
+                    return response
+
+                status = response.status_code
+
+                if is_last or status not in self.retry_statuses:
+                    raise TinyPNGError(
+                        f'{status}: {response.text[:200]}',
+                        status=status
+                    )
+
+                time.sleep(self.get_retry_delay(attempt, response))
+
+    def compress(self, data: bytes) -> bytes:
+        response = self.request('POST', '/shrink', data=data)
+        location = response.headers.get('Location')
+
+        if not location:
+            raise TinyPNGError('No location of a compressed image')
+
+        return self.request('GET', location).content
+
+    def compress_or_none(self, data: bytes):
+        try:
+            return self.compress(data)
+        except TinyPNGError as e:
+            logger.error(f'TinyPNG error: {e}')
+
+        return None
+
+
+@lru_cache(maxsize=None)
+def get_api_key_function():
+    return import_string(TINYPNG_API_KEY_FUNCTION)
+
+
+_api_key_cache = {}
+_api_key_lock = threading.Lock()
+
+
+def get_tinypng_api_key():
+    """
+    Return TinyPNG api key. A key, returned by `TINYPNG_API_KEY_FUNCTION`,
+    is cached for `TINYPNG_API_KEY_CACHE_TIMEOUT` seconds.
+    """
+    if not TINYPNG_API_KEY_FUNCTION:
+        return TINYPNG_API_KEY
+
+    with _api_key_lock:
+        api_key, expires_at = _api_key_cache.get('key', (None, 0))
+
+        if time.monotonic() >= expires_at:
+            func = get_api_key_function()
+            api_key = func() if callable(func) else TINYPNG_API_KEY
+            _api_key_cache['key'] = (
+                api_key,
+                time.monotonic() + TINYPNG_API_KEY_CACHE_TIMEOUT
+            )
+
+    return api_key
+
+
+@lru_cache(maxsize=None)
+def get_client(api_key):
+    return TinyPNGClient(api_key, **TINYPNG_CLIENT_OPTIONS)
+
+
+def get_tinypng_client():
+    """Return a shared client of a current api key or `None` without a key."""
+    api_key = get_tinypng_api_key()
+
+    if not api_key:
+        return None
+
+    return get_client(api_key)
@@ -1,29 +1,51 @@
-from io import BytesIO
+from collections import namedtuple
+from concurrent.futures import (
+    FIRST_COMPLETED,
+    ProcessPoolExecutor,
+    ThreadPoolExecutor,
+    wait
+)
+from functools import reduce
+import hashlib
+from itertools import islice
 import logging
-from PIL import Image
-from PIL.WebPImagePlugin import WebPImageFile
+import multiprocessing
+import os
+import shutil
+import tempfile
 
 from django.apps import apps
+from django.core.files import File
+from django.core.files.base import ContentFile
 from django.db.models import Model, QuerySet
 from django.utils import timezone
-from django.utils.module_loading import import_string
 from django.utils.text import slugify
 
-import tinify
-from tinify import Error
 from unidecode import unidecode
-from versatileimagefield.image_warmer import VersatileImageFieldWarmer
+from versatileimagefield.files import VersatileImageFieldFile
+from versatileimagefield.settings import cache, VERSATILEIMAGEFIELD_CACHE_LENGTH
 
 from .consts import (
-    IMAGE_ALLOWED_EXTENSIONS,
+    IMAGE_ASYNC_RENDITIONS,
     IMAGE_DEFAULT_RENDITION_KEY_SET,
-    IMAGE_RENDITION_KEY_SETS,
-    IMAGE_OPTIMIZE_QUALITY,
-    IMAGE_RGBA_CHANGE_BACKGROUND,
-    TINYPNG_ALLOWED_EXTENSIONS,
-    TINYPNG_API_KEY_FUNCTION,
-    TINYPNG_API_KEY
+    IMAGE_OPTIMIZE_MAX_MEMORY_SIZE,
+    IMAGE_OPTIMIZE_MIN_GAIN
+)
+from .compressors import get_compressors
+from .contrib.versatileimagefield.utils import rendition_paths
+from .files import delete_files
+from .index import get_rendition_index
+from .keysets import get_key_set
+from .metrics import increment, timer
+from .renditions import (
+    create_renditions,
+    get_rendition,
+    get_rendition_names,
+    get_renditions_file
 )
+from .tasks import enqueue_warm_images
+from .tinypng import get_tinypng_api_key
+from .workers import init_worker, warm_images_chunk
 
 logger = logging.getLogger(__name__)
 
@@ -31,26 +53,23 @@ __all__ = (
     'get_tinypng_api_key',
     'get_file_extension',
     'image_optimizer',
+    'OptimizationResult',
+    'OptimizationStats',
+    'optimize_stored_image',
+    'get_content_hash',
     'image_upload_to',
+    'hashed_image_upload_to',
     'get_model_image_fields',
+    'get_image_querysets',
+    'get_queryset_batches',
+    'get_warm_images_executor',
     'delete_all_created_images',
     'warm_images',
+    'prefetch_renditions',
     'optimize_existing_images'
 )
 
 
-def get_tinypng_api_key():
-    api_key = TINYPNG_API_KEY
-
-    if TINYPNG_API_KEY_FUNCTION:
-        func = import_string(TINYPNG_API_KEY_FUNCTION)
-
-        if callable(func):
-            api_key = func()
-
-    return api_key
-
-
 def get_file_extension(file_name):
     # Get image file extension
     extension = file_name.split('.')[-1]
@@ -63,79 +82,240 @@ def get_file_extension(file_name):
     return extension
 
 
-def image_optimizer(data):
-    """Optimize an image that has not been saved to a file."""
+def replace_file_content(data, content):
+    """
+    Replace content of an uploaded file with `content` (bytes or a file)
+    in place and update its size.
+    """
+    data.file.seek(0)
+
+    if isinstance(content, bytes):
+        data.file.write(content)
+    else:
+        content.seek(0)
+        shutil.copyfileobj(content, data.file)
+
+    data.file.truncate()
+    data.size = data.file.tell()
+    data.seek(0)
+
+
+def get_content_size(content):
+    content.seek(0, os.SEEK_END)
+    return content.tell()
+
+
+def has_min_gain(original_size, optimized_size, min_gain):
+    """
+    Whether an optimized image is smaller at least by `min_gain` part
+    of the original size, so it's worth replacing the original.
+    """
+    return original_size - optimized_size >= max(original_size * min_gain, 1)
+
+
+def get_optimized_content(data):
+    """
+    Compress an image with compressors of its format (`IMAGE_COMPRESSORS`).
+    Return bytes, a file or `None`, if the image isn't supported.
+    """
+    extension = get_file_extension(data.name)
+
+    for compressor in get_compressors(extension):
+        content = compressor.compress(data, extension)
+
+        if content is not None:
+            return content
+
+    return None
+
+
+def image_optimizer(data, min_gain=IMAGE_OPTIMIZE_MIN_GAIN):
+    """
+    Optimize an image that has not been saved to a file.
+
+    An optimized image is kept in a spooled temporary file and is copied
+    over an upload in chunks, so at most one extra copy of an image
+    is kept in memory (up to `IMAGE_OPTIMIZE_MAX_MEMORY_SIZE` bytes).
+    An upload is kept as is, unless an optimized image is smaller
+    at least by `min_gain` part of its size.
+    """
     if not data:
         return data
 
-    extension = get_file_extension(data.name)
+    original_size = data.size
+    image_format = get_file_extension(data.name)
+    replaced = False
 
-    optimized = False
-    buffer = None
+    with timer('optimizer', format=image_format):
+        content = get_optimized_content(data)
 
-    tinypng_api_key = get_tinypng_api_key()
+        if isinstance(content, bytes):
+            content = ContentFile(content)
 
-    if (
-            tinypng_api_key
-            and extension.lower()
-            in TINYPNG_ALLOWED_EXTENSIONS
-    ):
-        tinify.key = tinypng_api_key
+        if content is not None:
+            with content:
+                replaced = has_min_gain(
+                    original_size, get_content_size(content), min_gain
+                )
 
-        try:
-            buffer = (
-                tinify.from_buffer(data.file.read()).to_buffer()
-            )
-            optimized = True
-        except Error as e:
-            logger.error(f"TinyPNG error: {e}")
+                if replaced:
+                    replace_file_content(data, content)
 
-    if not optimized and extension in IMAGE_ALLOWED_EXTENSIONS:
-        image = Image.open(data)
-        bytes_io = BytesIO()
+        if not replaced:
+            data.seek(0)
 
-        if image.mode in ('RGBA', 'LA') and IMAGE_RGBA_CHANGE_BACKGROUND:
-            background = (
-                Image.new(image.mode[:-1], image.size, '#FFFFFF')
-            )
-            background.paste(image, image.split()[-1])
-            image = background
-
-        # hidden webp image
-        if isinstance(image, WebPImageFile) and extension.lower() != 'webp':
-            new_name = data.name.rsplit('.', 1)[0] + '.webp'
-            data.name = new_name
-            extension = 'WEBP'
-
-        # for PNG
-        # if image.mode == 'P':
-            # image = image.convert('RGB')
-
-        save_kwargs = {
-            'format': extension,
-            'optimize': True,
-            'quality': IMAGE_OPTIMIZE_QUALITY,
-        }
-
-        if extension == 'WEBP':
-            save_kwargs['lossless'] = True
-        elif extension == 'JPEG':
-            save_kwargs['progressive'] = True
-
-        image.save(
-            bytes_io,
-            **save_kwargs
+    if replaced:
+        increment(
+            'optimizer.saved_bytes',
+            original_size - data.size,
+            format=image_format
         )
-        buffer = bytes_io.getvalue()
-
-    if buffer:
-        data.seek(0)
-        data.file.write(buffer)
-        data.file.truncate()
 
     return data
 
 
+def replace_stored_file(storage, name, content):
+    """
+    Replace a file on storage with `content`.
+    A local file is replaced atomically by renaming a temporary file
+    over it, remote storages get a file deleted and saved again.
+    """
+    content.seek(0)
+
+    try:
+        path = storage.path(name)
+    except NotImplementedError:
+        path = None
+
+    if path is None:
+        storage.delete(name)
+        saved_name = storage.save(name, content)
+
+        if saved_name != name:
+            logger.warning(f'{name} is replaced with {saved_name}')
+
+        return
+
+    fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            shutil.copyfileobj(content, f)
+
+        shutil.copymode(path, temp_path)
+        os.replace(temp_path, path)
+    except BaseException:
+        os.remove(temp_path)
+        raise
+
+
+class OptimizationResult(namedtuple(
+    'OptimizationResult',
+    ('name', 'original_size', 'optimized_size', 'replaced')
+)):
+    """Result of optimization of a stored image."""
+
+    @property
+    def saved_size(self):
+        if not self.replaced:
+            return 0
+
+        return self.original_size - self.optimized_size
+
+
+class OptimizationStats:
+    """Totals of optimization of stored images."""
+
+    def __init__(self):
+        self.processed = 0
+        self.replaced = 0
+        self.skipped = 0
+        self.original_size = 0
+        self.saved_size = 0
+
+    def add(self, result: OptimizationResult):
+        self.processed += 1
+        self.replaced += result.replaced
+        self.original_size += result.original_size
+        self.saved_size += result.saved_size
+
+    def merge(self, stats: 'OptimizationStats'):
+        for attr, value in vars(stats).items():
+            setattr(self, attr, getattr(self, attr) + value)
+
+    def __str__(self):
+        return (
+            f'{self.processed} processed, {self.replaced} replaced, '
+            f'{self.skipped} skipped, {self.saved_size} bytes saved '
+            f'of {self.original_size}'
+        )
+
+
+def optimize_stored_image(storage, name, min_gain=IMAGE_OPTIMIZE_MIN_GAIN,
+                          dry_run=False):
+    """
+    Optimize an already stored image in place.
+
+    An image is encoded into a buffer first and replaces the original
+    only if it's smaller at least by `min_gain` part of the original size,
+    so an already optimized image is never re-encoded on storage or grown.
+    An image is marked as optimized in the rendition index.
+    Nothing is changed with `dry_run`.
+    """
+    with tempfile.SpooledTemporaryFile(
+            max_size=IMAGE_OPTIMIZE_MAX_MEMORY_SIZE
+    ) as file:
+        with storage.open(name, 'rb') as source:
+            shutil.copyfileobj(source, file)
+
+        original_size = file.tell()
+        data = File(file, name=os.path.basename(name))
+        data.size = original_size
+        # a hidden webp image is optimized in place too, without renaming
+        content = get_optimized_content(data)
+        optimized_size = original_size
+        replaced = False
+
+        if isinstance(content, bytes):
+            content = ContentFile(content)
+
+        if content is not None:
+            with content:
+                optimized_size = get_content_size(content)
+                replaced = has_min_gain(
+                    original_size, optimized_size, min_gain
+                )
+
+                if replaced and not dry_run:
+                    replace_stored_file(storage, name, content)
+
+    if not dry_run:
+        get_rendition_index().add_optimized(storage, name)
+
+    return OptimizationResult(name, original_size, optimized_size, replaced)
+
+
+def get_content_hash(data):
+    """Return SHA-256 hex digest of a file, read in chunks."""
+    content_hash = hashlib.sha256()
+    data.seek(0)
+
+    for chunk in data.chunks():
+        content_hash.update(chunk)
+
+    data.seek(0)
+    return content_hash.hexdigest()
+
+
+def get_upload_folder(instance):
+    if hasattr(instance, 'content_object'):
+        class_name = instance.content_object.__class__.__name__
+    else:
+        class_name = instance.__class__.__name__
+
+    return f"{instance._meta.app_label}/{slugify(class_name)}"
+
+
 def image_upload_to(instance, filename):
     """
     Util to set upload_to path, based on model's class name and date of uploading,
@@ -150,15 +330,34 @@ def image_upload_to(instance, filename):
 
     tz_now = tz_now.strftime('%Y/%m/%d')
 
-    if hasattr(instance, 'content_object'):
-        class_name = instance.content_object.__class__.__name__
+    return (
+        f"{get_upload_folder(instance)}/"
+        f"{tz_now}/"
+        f"{filename}".lower()
+    )
+
+
+def hashed_image_upload_to(instance, filename, field_name=None):
+    """
+    Util to set upload_to path of a deduplicated image, which is named
+    by a content hash (see `OptimizedVersatileImageFieldFile.save`),
+    so the same image is stored under the same path.
+
+    With `field_name` a folder is of a model field, so an image is shared
+    only by instances, which `is_shared` of a file checks.
+    """
+    if field_name is None:
+        folder = get_upload_folder(instance)
     else:
-        class_name = instance.__class__.__name__
+        folder = (
+            f"{instance._meta.app_label}/"
+            f"{instance._meta.model_name}/"
+            f"{field_name}"
+        )
 
     return (
-        f"{instance._meta.app_label}/"
-        f"{slugify(class_name)}/"
-        f"{tz_now}/"
+        f"{folder}/"
+        f"{filename[:2]}/"
         f"{filename}".lower()
     )
 
@@ -176,125 +375,488 @@ def get_model_image_fields(model: 'Model'):
     return image_fields
 
 
-def delete_all_created_images(*all_models, delete_images: bool = True):
+def get_image_querysets(*models_or_querysets):
+    """
+    Return querysets of passed models (or querysets as is),
+    querysets of all models if nothing is passed.
+    """
+    if not models_or_querysets:
+        models_or_querysets = apps.get_models()
+
+    for model_or_queryset in models_or_querysets:
+        if isinstance(model_or_queryset, QuerySet):
+            yield model_or_queryset
+        else:
+            yield model_or_queryset._default_manager.all()
+
+
+def get_queryset_batches(queryset, batch_size: int = 1000):
     """
-    Delete all created images and clear cache
+    Split a queryset into querysets of consecutive primary key ranges
+    of `batch_size` instances, so memory usage doesn't depend on table size.
+
+    Yields a 3-tuple:
+        [0]: A queryset of a batch
+        [1]: Number of instances in a batch
+        [2]: The last primary key of a batch
     """
-    if not all_models:
-        all_models = apps.get_models()
+    queryset = queryset.order_by('pk')
+    last_pk = None
+
+    while True:
+        batch_queryset = queryset
+
+        if last_pk is not None:
+            batch_queryset = batch_queryset.filter(pk__gt=last_pk)
 
-    for model in all_models:
+        pks = list(
+            batch_queryset
+            .values_list('pk', flat=True)[:batch_size]
+        )
+
+        if not pks:
+            break
+
+        yield batch_queryset.filter(pk__lte=pks[-1]), len(pks), pks[-1]
+
+        last_pk = pks[-1]
+
+
+def delete_all_created_images(*all_models, delete_images: bool = True,
+                              listdir: bool = False,
+                              chunk_size: int = 1000):
+    """
+    Delete all created images and clear cache.
+    Accepts models or querysets.
+
+    Names of renditions are computed from size keys of a field, which
+    are resolved once, and from image names and ppoi, which are streamed
+    without creating instances, so renditions are never resolved
+    or created, and are joined with names of the rendition index.
+    Images, cache and index of a chunk are cleared at once.
+    With `listdir` storage folders are listed to find images of any sizes.
+    Returns a number of cleared renditions.
+    """
+    index = get_rendition_index()
+    total = 0
+
+    for queryset in get_image_querysets(*all_models):
+        model = queryset.model
+        label = model._meta.label
         image_fields = get_model_image_fields(model)
 
         if not image_fields:
             continue
 
-        image_sizes = getattr(model, 'image_sizes', None)
-        key_sets = IMAGE_RENDITION_KEY_SETS.get(image_sizes, [])
+        # files of rows are bound to a blank instance
+        instance = model()
 
-        for obj in model.objects.all():
-            for field in image_fields:
-                image_field = getattr(obj, field.name)
+        for field in image_fields:
+            storage = field.storage
+            size_keys = field.attr_class(instance, field, None).get_size_keys()
+            columns = [field.attname]
 
-                if image_field:
-                    if image_field.image_sizes:
-                        image_sizes = image_field.image_sizes
+            if field.ppoi_field:
+                columns.append(field.ppoi_field)
 
-                        # default key set
-                        if isinstance(image_sizes, list):
-                            key_sets = []
-                        else:
-                            key_sets = IMAGE_RENDITION_KEY_SETS.get(image_sizes, [])
+            rows = (
+                queryset
+                .exclude(**{field.attname: ''})
+                .exclude(**{f'{field.attname}__isnull': True})
+                .values_list(*columns)
+                .iterator()
+            )
+            processed = 0
 
-                    if delete_images:
-                        image_field.delete_all_created_images()
+            while True:
+                chunk = list(islice(rows, chunk_size))
 
-                    # clear cache
-                    for key_set in key_sets:
-                        name, rendition_key = key_set
+                if not chunk:
+                    break
 
-                        if '__' in rendition_key:
-                            rendition_key_set = rendition_key.split('__')
-                            print(rendition_key_set)
+                names = set()
 
-                            if rendition_key_set:
-                                if len(rendition_key_set) == 2:
-                                    method, size = rendition_key_set
+                for name, *ppoi in chunk:
+                    if delete_images and listdir:
+                        file = field.attr_class(instance, field, name)
+                        file.delete_all_created_images(listdir=True)
+                        continue
 
-                                    getattr(image_field, method)[size].clear_cache()
+                    image_file = VersatileImageFieldFile(instance, field, name)
 
-                                # clear filters cache
-                                elif rendition_key_set[0] == 'filters':
-                                    filters = getattr(image_field, 'filters')
-                                    getattr(filters, rendition_key_set[1]).clear_cache()
+                    if ppoi:
+                        image_file.ppoi = ppoi[0]
 
-                    image_field.thumbnail['300x300'].clear_cache()
+                    names.update(get_rendition_names(image_file, size_keys))
+
+                    # renditions of the index, e.g. of other sizes
+                    if delete_images:
+                        names.update(
+                            index.get_renditions(storage, name) or ()
+                        )
+
+                names = list(names)
+                rendition_paths.invalidate(*(name for name, *_ in chunk))
+
+                if delete_images:
+                    delete_files(storage, names)
+                    index.remove(storage, names)
+
+                cache.delete_many([storage.url(name) for name in names])
+                processed += len(chunk)
+                total += len(names)
+                logger.info(
+                    f'{label}.{field.name}: {processed} images, '
+                    f'{len(names)} renditions cleared'
+                )
+
+    return total
 
 
 def warm_images(
         instance_or_queryset,
         rendition_key_set: str = None,
-        image_attr: str = None
+        image_attr: str = None,
+        workers: int = None,
+        chunk_size: int = 100,
+        executor=None
 ):
-    if rendition_key_set and image_attr:
-        img_warmer = VersatileImageFieldWarmer(
-            instance_or_queryset=instance_or_queryset,
+    """
+    Create all renditions for a given instance or queryset.
+    Each original image is retrieved and decoded once for a whole key set.
+    With `workers` a queryset is split into chunks of `chunk_size`
+    instances, which are warmed in a pool of `workers` processes.
+    A pool could be passed as `executor` (see `get_warm_images_executor`)
+    to reuse it between calls.
+
+    Returns a 2-tuple:
+        [0]: Number of images successfully pre-warmed
+        [1]: A list of paths of original images, renditions of which
+             could not be created
+    """
+    if (workers or executor) and isinstance(instance_or_queryset, QuerySet):
+        if executor is None:
+            with get_warm_images_executor(workers) as executor:
+                return warm_images(
+                    instance_or_queryset,
+                    rendition_key_set=rendition_key_set,
+                    image_attr=image_attr,
+                    workers=workers,
+                    chunk_size=chunk_size,
+                    executor=executor
+                )
+
+        return _warm_images_in_processes(
+            queryset=instance_or_queryset,
             rendition_key_set=rendition_key_set,
-            image_attr=image_attr
+            image_attr=image_attr,
+            executor=executor,
+            max_pending=(workers or multiprocessing.cpu_count()) * 2,
+            chunk_size=chunk_size
         )
-        return img_warmer.warm()
 
     if isinstance(instance_or_queryset, QuerySet):
         model = instance_or_queryset.model
+        instances = instance_or_queryset.iterator()
     else:
         model = instance_or_queryset.__class__
+        instances = [instance_or_queryset]
+
+    if rendition_key_set and image_attr:
+        # `image_attr` could be a dot-notated path to any versatile image field
+        image_attrs = [
+            (image_attr, get_key_set(rendition_key_set).compiled_keys)
+        ]
+    else:
+        if image_attr:
+            image_fields = [model._meta.get_field(image_attr)]
+        else:
+            image_fields = get_model_image_fields(model)
+
+        image_attrs = [
+            (
+                image_field.name,
+                get_key_set(
+                    rendition_key_set
+                    or image_field.image_sizes
+                    or getattr(model, 'image_sizes', None)
+                    or IMAGE_DEFAULT_RENDITION_KEY_SET
+                ).compiled_keys
+            )
+            for image_field in image_fields
+            if image_field.name
+        ]
+
+    num_images_pre_warmed = 0
+    failed_to_create_image_path_list = []
+
+    for instance in instances:
+        for attr, size_keys in image_attrs:
+            image_file = reduce(getattr, attr.split('.'), instance)
+
+            if not image_file:
+                continue
+
+            try:
+                create_renditions(image_file, size_keys)
+            except Exception:
+                logger.exception(
+                    'Thumbnail generation failed',
+                    extra={'path': image_file.name}
+                )
+                failed_to_create_image_path_list.append(image_file.name)
+            else:
+                num_images_pre_warmed += len(size_keys)
+
+    return num_images_pre_warmed, failed_to_create_image_path_list
+
+
+def get_warm_images_executor(workers: int = None):
+    return ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=multiprocessing.get_context('spawn'),
+        # spawned workers don't inherit database connections
+        # of the parent process and open their own ones
+        initializer=init_worker
+    )
+
+
+def _warm_images_in_processes(
+        queryset,
+        rendition_key_set,
+        image_attr,
+        executor,
+        max_pending,
+        chunk_size
+):
+    model_label = queryset.model._meta.label
+    pks = (
+        queryset
+        .order_by('pk')
+        .values_list('pk', flat=True)
+        .iterator()
+    )
+    num_images_pre_warmed = 0
+    failed_to_create_image_path_list = []
+    futures = set()
+
+    while True:
+        chunk = list(islice(pks, chunk_size))
+
+        if chunk:
+            futures.add(
+                executor.submit(
+                    warm_images_chunk,
+                    model_label,
+                    chunk,
+                    rendition_key_set,
+                    image_attr
+                )
+            )
+
+        # keep a bounded amount of chunks in flight
+        if futures and (not chunk or len(futures) >= max_pending):
+            done, futures = wait(futures, return_when=FIRST_COMPLETED)
+
+            for future in done:
+                num, failed = future.result()
+                num_images_pre_warmed += num
+                failed_to_create_image_path_list.extend(failed)
+
+        if not chunk and not futures:
+            break
+
+    return num_images_pre_warmed, failed_to_create_image_path_list
+
+
+def get_existing_renditions(renditions):
+    """
+    Return names of existing renditions of (image file, rendition) pairs
+    with a single index lookup per storage.
+    """
+    index = get_rendition_index()
+    names_by_storage = {}
+
+    for image_file, rendition in renditions:
+        storage = image_file.storage
+        names_by_storage.setdefault(id(storage), (storage, []))[1].append(
+            rendition.name
+        )
+
+    existing = set()
+
+    for storage, names in names_by_storage.values():
+        existing |= index.filter_existing(storage, names)
+
+    return existing
+
+
+def prefetch_renditions(instances, image_attr: str = None):
+    """
+    Resolve image variations for all `instances` at once.
+    Renditions are checked with a single `cache.get_many` call
+    and marked as existing with a single `cache.set_many` call,
+    rendition index is asked only about renditions missing in cache.
+    Missing renditions of an image are created at once with a single
+    decode (see `create_renditions`), or are enqueued in async mode,
+    and the original image is returned until they're created.
+    """
+    instances = list(instances)
+
+    if not instances:
+        return instances
+
+    model = instances[0].__class__
 
     if image_attr:
         image_fields = [model._meta.get_field(image_attr)]
     else:
         image_fields = get_model_image_fields(model)
 
-    for image_field in image_fields:
-        if image_field.name == "":
-            continue
+    variations = []
+
+    for instance in instances:
+        for field in image_fields:
+            image_file = getattr(instance, field.name)
 
-        if rendition_key_set is None:
-            rendition_key_set = (
-                image_field.image_sizes
-                or getattr(model, 'image_sizes')
+            if not (image_file and image_file._committed):
+                for name, _ in image_file.image_sizes:
+                    setattr(image_file, name, field.placeholder_image_name)
+
+                continue
+
+            renditions_file = get_renditions_file(image_file)
+
+            for size_key in image_file.image_sizes.compiled_keys:
+                rendition = get_rendition(renditions_file, size_key)
+                variations.append(
+                    (image_file, size_key.name, size_key, rendition)
+                )
+
+    renditions = {
+        rendition.url: (image_file, size_key, rendition)
+        for image_file, name, size_key, rendition in variations
+        if (
+            rendition.image is not None
+            and rendition.url is not None
+            and image_file.create_on_demand
+        )
+    }
+    cached = cache.get_many(list(renditions))
+    not_cached = {
+        url: (image_file, size_key, rendition)
+        for url, (image_file, size_key, rendition) in renditions.items()
+        if url not in cached
+    }
+    existing = get_existing_renditions(
+        (image_file, rendition)
+        for image_file, size_key, rendition in not_cached.values()
+    )
+    confirmed = {}
+    # size keys of missing renditions by images
+    missing = {}
+
+    for url, (image_file, size_key, rendition) in not_cached.items():
+        if rendition.name in existing:
+            confirmed[url] = 1
+        else:
+            missing.setdefault(id(image_file), (image_file, []))[1].append(
+                size_key
             )
 
-        img_warmer = VersatileImageFieldWarmer(
-            instance_or_queryset=instance_or_queryset,
-            rendition_key_set=(
-                rendition_key_set
-                or IMAGE_DEFAULT_RENDITION_KEY_SET
-            ),
-            image_attr=image_field.name
+    if confirmed:
+        cache.set_many(confirmed, VERSATILEIMAGEFIELD_CACHE_LENGTH)
+
+    not_created = set()
+
+    if missing:
+        for image_file, size_keys in missing.values():
+            if IMAGE_ASYNC_RENDITIONS:
+                enqueue_warm_images(image_file)
+            else:
+                create_renditions(image_file, size_keys)
+
+        # created renditions are cached, renditions, which are enqueued
+        # or created by other workers, aren't
+        not_created = set(not_cached) - set(confirmed)
+        not_created -= set(cache.get_many(list(not_created)))
+
+    for image_file, name, size_key, rendition in variations:
+        setattr(
+            image_file,
+            name,
+            image_file.url if rendition.url in not_created else rendition.url
         )
-        img_warmer.warm()
 
+    return instances
 
-def optimize_existing_images(*all_models):
-    if not all_models:
-        all_models = apps.get_models()
 
-    for model in all_models:
-        image_fields = get_model_image_fields(model)
+def optimize_existing_images(*all_models,
+                             min_gain: float = IMAGE_OPTIMIZE_MIN_GAIN,
+                             dry_run: bool = False,
+                             force: bool = False,
+                             chunk_size: int = 100,
+                             workers: int = 1):
+    """
+    Optimize existing images in place.
+    Accepts models or querysets.
+
+    Images, marked as optimized in the rendition index, are skipped
+    unless `force`, so re-runs only check markers, a chunk of images
+    at once. Images of a chunk are optimized in `workers` threads,
+    TinyPNG requests in flight are limited by the shared client.
+    Returns `OptimizationStats`.
+    """
+    index = get_rendition_index()
+    stats = OptimizationStats()
 
-        if not image_fields:
-            continue
+    def optimize(storage, name):
+        try:
+            return optimize_stored_image(
+                storage,
+                name,
+                min_gain=min_gain,
+                dry_run=dry_run
+            )
+        except Exception:
+            logger.exception(f'Failed to optimize {name}')
+
+        return None
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for queryset in get_image_querysets(*all_models):
+            image_fields = get_model_image_fields(queryset.model)
+
+            if not image_fields:
+                continue
+
+            # instances aren't created, so renditions aren't resolved
+            rows = queryset.values_list(
+                *[field.attname for field in image_fields]
+            ).iterator()
+
+            while True:
+                chunk = list(islice(rows, chunk_size))
 
-        for obj in model.objects.all():
-            for field in image_fields:
-                image_field = getattr(obj, field.name)
-
-                if image_field:
-                    extension = get_file_extension(image_field.name)
-                    image = Image.open(image_field.path)
-                    image.save(
-                        image_field.path,
-                        format=extension.upper(),
-                        optimize=True,
-                        quality=IMAGE_OPTIMIZE_QUALITY,
+                if not chunk:
+                    break
+
+                for i, field in enumerate(image_fields):
+                    storage = field.storage
+                    names = {row[i] for row in chunk if row[i]}
+                    skipped = set()
+
+                    if not force:
+                        skipped = index.filter_optimized(storage, names)
+
+                    stats.skipped += len(skipped)
+                    results = executor.map(
+                        lambda name: optimize(storage, name),
+                        names - skipped
                     )
+
+                    for result in results:
+                        if result is not None:
+                            stats.add(result)
+
+    return stats
@@ -1,6 +1,3 @@
-from io import BytesIO
-import magic
-
 from django.core.exceptions import ValidationError
 from django.core.validators import BaseValidator
 from django.template.defaultfilters import filesizeformat
@@ -8,17 +5,26 @@ from django.utils.deconstruct import deconstructible
 from django.utils.translation import gettext_lazy as _
 from PIL import Image
 
+from .consts import IMAGE_MAX_PIXELS
+from .probe import probe_image
+
 __all__ = (
     'BaseSizeValidator',
     'MinSizeValidator',
     'MaxSizeValidator',
     'FileSizeValidator',
+    'MaxPixelsValidator',
 )
 
 
 class BaseSizeValidator(BaseValidator):
     """Base validator that validates the size of an image."""
 
+    invalid_message = _(
+        'Upload a valid image. The file you uploaded was either not an '
+        'image or a corrupted image.'
+    )
+
     def __init__(self, width, height):
         self.limit_value = width or float('inf'), height or float('inf')
 
@@ -41,11 +47,12 @@ class BaseSizeValidator(BaseValidator):
         return True
 
     def clean(self, value):
-        value.seek(0)
-        stream = BytesIO(value.read())
-        size = Image.open(stream).size
-        value.seek(0)
-        return size
+        probe = probe_image(value)
+
+        if probe.width is None:
+            raise ValidationError(self.invalid_message, code='invalid_image')
+
+        return probe.width, probe.height
 
 
 class MaxSizeValidator(BaseSizeValidator):
@@ -85,6 +92,58 @@ class MinSizeValidator(BaseSizeValidator):
         return img_size[0] < min_size[0] or img_size[1] < min_size[1]
 
 
+@deconstructible
+class MaxPixelsValidator(BaseValidator):
+    """
+    ImageField validator to validate a number of pixels of an uploaded
+    image from its header, before it's decoded. Stored images aren't
+    read again, they're checked, when they're decoded.
+
+    image = OptimizedImageField(validators=[MaxPixelsValidator(25000000)])
+    """
+    code = 'max_pixels'
+    message = _(
+        'The image you uploaded is too large.'
+        ' The maximum number of pixels is %(limit_value)s,'
+        ' the image has %(show_value)s pixels.'
+    )
+    invalid_message = BaseSizeValidator.invalid_message
+
+    def __init__(self, limit_value=IMAGE_MAX_PIXELS, message=None):
+        super().__init__(limit_value, message)
+
+    def __call__(self, value):
+        if getattr(value, '_committed', False):
+            return
+
+        super().__call__(value)
+
+    def compare(self, pixels, max_pixels):
+        return max_pixels is not None and pixels > max_pixels
+
+    def clean(self, value):
+        probe = probe_image(value)
+
+        if probe.decompression_bomb:
+            # an image has more pixels, than Pillow decodes at all
+            raise ValidationError(
+                self.message,
+                code=self.code,
+                params={
+                    'limit_value': self.limit_value,
+                    'show_value': _('more than %(pixels)s') % {
+                        'pixels': 2 * Image.MAX_IMAGE_PIXELS
+                    },
+                    'value': value,
+                }
+            )
+
+        if probe.width is None:
+            raise ValidationError(self.invalid_message, code='invalid_image')
+
+        return probe.width * probe.height
+
+
 def _to_mb(value: int):
     if value:
         value *= 1024 * 1024
@@ -139,8 +198,7 @@ class FileSizeValidator:
             )
 
         if self.content_types:
-            content_type = magic.from_buffer(value.read(), mime=True)
-            value.seek(0)
+            content_type = probe_image(value).mime_type
 
             if content_type not in self.content_types:
                 params = {'content_type': content_type}
@@ -0,0 +1,25 @@
+"""
+Entry points of worker processes.
+The module must be importable before django is set up, because
+spawned workers import it to unpickle a task.
+"""
+import django
+from django.apps import apps
+
+__all__ = (
+    'init_worker',
+    'warm_images_chunk',
+)
+
+
+def init_worker():
+    if not apps.ready:
+        django.setup()
+
+
+def warm_images_chunk(model_label, pks, rendition_key_set, image_attr):
+    from .utils import warm_images
+
+    model = apps.get_model(model_label)
+    queryset = model._default_manager.filter(pk__in=pks)
+    return warm_images(queryset, rendition_key_set, image_attr)